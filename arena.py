@@ -0,0 +1,267 @@
+'''
+tournament runner: plays many games between two bots across a process pool
+
+    from arena import run_match, format_report
+    report = run_match(line_completer_bot, search_bot, n_games=10000)
+    print(format_report(report))
+
+agents are passed as classes (or any picklable zero-argument factory) and built once per
+chunk of games, so a bot instance plays chunk_size games in a row
+games come in colour-swapped pairs that share the same seeded random opening,
+and every game reseeds np.random/random from (seed, game index); the chunks don't depend on
+n_jobs, so results don't depend on how the games were spread over the workers
+'''
+import math
+import os
+import random
+import multiprocessing
+from statistics import NormalDist
+from time import perf_counter
+
+import numpy as np
+
+from board import board_obj
+from operations import ops
+from profiling import profiler
+
+# games a bot instance plays in a row in run_match, small enough to balance the workers'
+# load on short matches, large enough to build fast bots rarely
+default_chunk_size = 16
+
+# move latency histogram bins: 20 per decade from 100ns to 100s
+latency_bins = np.logspace(-7, 2, 181)
+
+def play_game(agent1, agent2, opening_moves: int = 4, opening_seed: int = None, prof: profiler = None) -> dict:
+    '''
+    plays one game, agent1 moves first (after the random opening)
+    result: 0 agent1 won, 1 agent2 won, 2 draw
+    an invalid move or an exception in move() forfeits the game, 'forfeit' holds the index of the
+    offending agent and 'error' the exception ('ValueError: ...', None for an invalid move)
+    with an enabled profiler every move is timed in a section named after the agent's class and
+    'moves' holds one record per move: agent index, seconds, ops calls and search nodes
+    '''
+    board = board_obj()
+    rng = random.Random(opening_seed)
+    for _ in range(opening_moves):
+        legal_moves = ops.get_valid_moves(board)
+        ops.make_move(board, legal_moves[rng.randrange(len(legal_moves))])
+        if ops.check_game_finished(board):
+            # openings this short can't finish a game, but don't rely on it
+            return play_game(agent1, agent2, opening_moves, rng.getrandbits(32), prof)
+
+    agents = (agent1, agent2)
+    times = ([], [])
+    records = [] if prof is not None else None
+    # the opening moves are nobody's, agent1 plays whichever side is to move next
+    first = board.n_moves%2
+    while True:
+        idx = (board.n_moves - first)%2
+        temp_dict = ops.pull_view(board)
+        move, error = None, None
+        if prof is not None:
+            calls = dict(prof.calls)
+        start = perf_counter()
+        try:
+            if prof is None:
+                move = agents[idx].move(temp_dict)
+            else:
+                with prof.section(type(agents[idx]).__name__):
+                    move = agents[idx].move(temp_dict)
+        except Exception as err:
+            error = f'{type(err).__name__}: {err}'
+        times[idx].append(perf_counter() - start)
+        if prof is not None:
+            records.append(_move_record(prof, calls, agents[idx], idx, times[idx][-1]))
+        if error is not None or not ops.check_move_is_valid(board, move):
+            return {'result': 1 - idx, 'forfeit': idx, 'error': error, 'n_moves': board.n_moves, 'times': times, 'board': board, 'moves': records}
+        ops.make_move(board, move)
+        if ops.check_game_finished(board):
+            winner = ops.get_winner(board)
+            if 'wins' in winner:
+                result = idx # the last mover made the line
+            else:
+                result = 2
+            return {'result': result, 'forfeit': None, 'error': None, 'n_moves': board.n_moves, 'times': times, 'board': board, 'moves': records}
+
+def _move_record(prof: profiler, calls_before: dict, agent, idx: int, seconds: float) -> dict:
+    ''' per-move instrumentation: the ops calls made during the move and the agent's search nodes '''
+    calls = {_label: _n - calls_before.get(_label, 0) for _label, _n in prof.calls.items()
+             if _n != calls_before.get(_label, 0) and _label.startswith('ops.')}
+    # search_bot counts nodes, mcts_bot playouts, root_parallel_bot work
+    nodes = next((getattr(agent, _name) for _name in ('nodes', 'playouts', 'work') if hasattr(agent, _name)), None)
+    if nodes is not None:
+        prof.count('nodes', nodes)
+    return {'agent': idx, 'seconds': seconds, 'calls': calls, 'nodes': nodes}
+
+def _game_seeds(seed: int, game_idx: int) -> tuple:
+    ''' (opening seed, bot seed) for a game; both games of a colour-swapped pair share the opening '''
+    return (seed * 1000003 + game_idx//2) & 0xffffffff, (seed * 7919 + game_idx * 104729 + 1) & 0xffffffff
+
+def _play_chunk(args: tuple) -> dict:
+    ''' worker: plays games [first, last) and returns their aggregate '''
+    agent_a, agent_b, seed, first, last, opening_moves, instrument = args
+    bot_a, bot_b = agent_a(), agent_b()
+    prof = profiler() if instrument else None
+    games = []
+    summary = {'a_wins': 0, 'b_wins': 0, 'draws': 0, 'a_forfeits': 0, 'b_forfeits': 0,
+               'a_first_wins': 0, 'b_first_wins': 0, 'n_moves': 0,
+               'a_hist': np.zeros(len(latency_bins)+1, dtype=np.int64),
+               'b_hist': np.zeros(len(latency_bins)+1, dtype=np.int64),
+               'a_time': 0.0, 'b_time': 0.0, 'a_max': 0.0, 'b_max': 0.0}
+    for game_idx in range(first, last):
+        opening_seed, bot_seed = _game_seeds(seed, game_idx)
+        np.random.seed(bot_seed)
+        random.seed(bot_seed)
+        # odd games swap colours
+        swapped = game_idx%2 == 1
+        if prof is not None:
+            prof.enable()
+        try:
+            game = play_game(*((bot_b, bot_a) if swapped else (bot_a, bot_b)), opening_moves, opening_seed, prof)
+        finally:
+            # a bot that raises must not leave the ops methods wrapped for the rest of the process
+            if prof is not None:
+                prof.disable()
+        if swapped:
+            times_a, times_b = game['times'][1], game['times'][0]
+            result = {0: 'b', 1: 'a', 2: 'd'}[game['result']]
+            forfeit = None if game['forfeit'] is None else 'ba'[game['forfeit']]
+        else:
+            times_a, times_b = game['times']
+            result = {0: 'a', 1: 'b', 2: 'd'}[game['result']]
+            forfeit = None if game['forfeit'] is None else 'ab'[game['forfeit']]
+        if prof is not None:
+            # per-move records name the agents by match side ('a'/'b') instead of seat
+            for _record in game['moves']:
+                _record['agent'] = ('ba' if swapped else 'ab')[_record['agent']]
+            games.append({'game': game_idx, 'swapped': swapped, 'result': result, 'forfeit': forfeit,
+                          'error': game['error'], 'n_moves': game['n_moves'], 'moves': game['moves']})
+
+        if result == 'd':
+            summary['draws'] += 1
+        else:
+            summary[result + '_wins'] += 1
+            if (result == 'a') != swapped:
+                summary[result + '_first_wins'] += 1
+        if forfeit is not None:
+            summary[forfeit + '_forfeits'] += 1
+        summary['n_moves'] += game['n_moves']
+        for name, times in (('a', times_a), ('b', times_b)):
+            if times:
+                summary[name + '_hist'] += np.bincount(np.searchsorted(latency_bins, times), minlength=len(latency_bins)+1)
+                summary[name + '_time'] += sum(times)
+                summary[name + '_max'] = max(summary[name + '_max'], max(times))
+    if prof is not None:
+        summary['profile'] = prof.state()
+        summary['games'] = games
+    return summary
+
+def latency_percentiles(hist: np.array, percentiles: tuple = (50, 90, 99)) -> dict:
+    ''' percentiles (in seconds) read from a latency histogram, accurate to the bin width (~12%) '''
+    total = hist.sum()
+    if total == 0:
+        return {f'p{_p}': float('nan') for _p in percentiles}
+    cdf = np.cumsum(hist) / total
+    edges = np.concatenate([[0.0], latency_bins, [np.inf]])
+    out = {}
+    for _p in percentiles:
+        _bin = int(np.searchsorted(cdf, _p / 100))
+        out[f'p{_p}'] = float(edges[_bin + 1]) if _bin < len(latency_bins) else float(latency_bins[-1])
+    return out
+
+def elo_stats(wins: int, losses: int, draws: int, confidence: float = 0.95) -> tuple:
+    '''
+    elo difference and the half width of its confidence interval
+    ci formula from view-source:https://3dkingdoms.com/chess/elo.htm
+    '''
+    total_games = wins + losses + draws
+    if total_games == 0:
+        return float('nan'), float('nan')
+
+    def _elo(score):
+        if score <= 0:
+            return -math.inf
+        if score >= 1:
+            return math.inf
+        return -400 * math.log10(1 / score - 1)
+
+    percentage = (wins + draws / 2) / total_games
+    wins_dev = wins / total_games * (1 - percentage)**2
+    draws_dev = draws / total_games * (0.5 - percentage)**2
+    losses_dev = losses / total_games * (0 - percentage)**2
+    std_dev = math.sqrt(wins_dev + draws_dev + losses_dev) / math.sqrt(total_games)
+
+    z = NormalDist().inv_cdf(1 - (1 - confidence) / 2)
+    diff = _elo(percentage + z * std_dev) - _elo(percentage - z * std_dev)
+    return _elo(percentage), diff / 2
+
+def run_match(agent_a, agent_b, n_games: int = 1000, seed: int = 0, n_jobs: int = None,
+              opening_moves: int = 4, chunk_size: int = None, instrument: bool = False) -> dict:
+    '''
+    plays n_games between agent_a and agent_b (classes or zero-argument factories)
+    n_jobs processes (default: all cores), n_jobs=1 plays in this process
+    chunk_size: games a bot instance plays in a row (even, so colour-swapped pairs stay together),
+                chunk_size=2 builds new bots for every pair
+    elo is from agent_a's point of view
+    instrument=True profiles the ops calls of every game (see profiling.py): the report gets the
+    merged 'profile' (a profiler) and 'game_records', one per game with per-move instrumentation
+    '''
+    n_jobs = n_jobs or os.cpu_count() or 1
+    # fixed chunks, so which games share a bot instance doesn't depend on n_jobs
+    chunk_size = default_chunk_size if chunk_size is None else chunk_size
+    tasks = [(agent_a, agent_b, seed, _first, min(_first + chunk_size, n_games), opening_moves, instrument)
+             for _first in range(0, n_games, chunk_size)]
+
+    start = perf_counter()
+    if n_jobs == 1:
+        summaries = [_play_chunk(_task) for _task in tasks]
+    else:
+        with multiprocessing.get_context().Pool(n_jobs) as pool:
+            summaries = list(pool.imap_unordered(_play_chunk, tasks))
+    elapsed = perf_counter() - start
+
+    total = {}
+    prof = profiler() if instrument else None
+    games = []
+    for summary in summaries:
+        if instrument:
+            prof.merge(summary.pop('profile'))
+            games += summary.pop('games')
+        for key, value in summary.items():
+            if key.endswith('_max'):
+                total[key] = max(total.get(key, 0.0), value)
+            else:
+                total[key] = total.get(key, 0) + value
+
+    elo_diff, elo_ci = elo_stats(total['a_wins'], total['b_wins'], total['draws'])
+    n_moves_a = int(total['a_hist'].sum())
+    n_moves_b = int(total['b_hist'].sum())
+    report = {'agents': (getattr(agent_a, '__name__', str(agent_a)), getattr(agent_b, '__name__', str(agent_b))),
+            'games': n_games,
+            'win': total['a_wins'], 'loss': total['b_wins'], 'draw': total['draws'],
+            'first_player_wins': total['a_first_wins'] + total['b_first_wins'],
+            'forfeits': (total['a_forfeits'], total['b_forfeits']),
+            'elo_diff': elo_diff, 'elo_conf_interval +/-': elo_ci,
+            'seconds': elapsed,
+            'games_per_sec': n_games / elapsed,
+            'moves_per_game': total['n_moves'] / n_games,
+            'latency': ({**latency_percentiles(total['a_hist']),
+                         'mean': total['a_time'] / max(n_moves_a, 1), 'max': total['a_max'], 'moves': n_moves_a},
+                        {**latency_percentiles(total['b_hist']),
+                         'mean': total['b_time'] / max(n_moves_b, 1), 'max': total['b_max'], 'moves': n_moves_b})}
+    if instrument:
+        report['profile'] = prof
+        report['game_records'] = sorted(games, key=lambda _game: _game['game'])
+    return report
+
+def format_report(report: dict) -> str:
+    ''' human readable summary of run_match '''
+    lines = [f"{report['agents'][0]} vs {report['agents'][1]}: {report['games']} games "
+             f"in {report['seconds']:.1f}s ({report['games_per_sec']:.1f} games/sec)",
+             f"  win {report['win']}  loss {report['loss']}  draw {report['draw']}  "
+             f"forfeits {report['forfeits'][0]}/{report['forfeits'][1]}",
+             f"  elo diff {report['elo_diff']:.1f} +/- {report['elo_conf_interval +/-']:.1f}"]
+    for name, latency in zip(report['agents'], report['latency']):
+        lines.append(f"  {name} move latency: mean {latency['mean']*1e3:.3f}ms  p50 {latency['p50']*1e3:.3f}ms  "
+                     f"p90 {latency['p90']*1e3:.3f}ms  p99 {latency['p99']*1e3:.3f}ms  max {latency['max']*1e3:.3f}ms")
+    return '\n'.join(lines)
@@ -0,0 +1,144 @@
+'''
+vectorised simulator: N games stepped together with NumPy
+
+batch_board holds the same state as N board_obj's, stacked:
+    markers   (N,9,9,2) bool
+    miniboxes (N,3,3,3) bool, channels p1, p2, stale
+    hist      (N,81,2) uint8
+    n_moves   (N,)
+plus the bitboards the rules are computed on (box_bits (N,2,9), macro_bits (N,3)),
+the active box (N,) and per-game finished/winner flags
+
+batch_ops mirrors ops (same rules, same line tables from bitboard.py), every call
+acts on all games at once, or on the games selected by a boolean mask
+
+    batch = batch_board(4096)
+    winners = batch_ops.random_playouts(batch, np.random.default_rng(0))
+'''
+import numpy as np
+
+import bitboard
+from board import board_obj
+from operations import ops
+
+_line_table = np.array(bitboard.line_table, dtype=bool)
+_completer_table = np.array(bitboard.completer_table, dtype=np.int16)
+# _unpack[mask] -> (9,) bool, the bits of a 9-bit mask
+_unpack = ((np.arange(512)[:,None] >> np.arange(9)) & 1).astype(bool)
+
+class batch_board():
+    def __init__(self, n_games: int):
+        self.n_games = n_games
+        self.markers = np.zeros((n_games,9,9,2), dtype=bool)
+        self.miniboxes = np.zeros((n_games,3,3,3), dtype=bool)
+        self.hist = np.zeros((n_games,81,2), dtype=np.uint8)
+        self.n_moves = np.zeros(n_games, dtype=np.int16)
+
+        self.box_bits = np.zeros((n_games,2,9), dtype=np.int16)
+        self.macro_bits = np.zeros((n_games,3), dtype=np.int16)
+        self.active = np.full(n_games, -1, dtype=np.int8) # box the player to move is sent to, -1 is anywhere
+        self.finished = np.zeros(n_games, dtype=bool)
+        self.winner = np.full(n_games, -1, dtype=np.int8) # 0 p1, 1 p2, 2 stale, -1 ongoing
+
+    def get_board(self, idx: int) -> board_obj:
+        ''' replays game idx into a regular board_obj '''
+        board = board_obj()
+        for _move in self.hist[idx, :self.n_moves[idx]]:
+            ops.make_move(board, (int(_move[0]), int(_move[1])))
+        return board
+
+class batch_ops():
+    @staticmethod
+    def get_valid_mask(batch: batch_board) -> np.array:
+        ''' (N,9,9) bool of the legal moves of every game, all False for finished games '''
+        _open = ~(batch.box_bits[:,0] | batch.box_bits[:,1]) & bitboard.full_box
+        _any_finished = batch.macro_bits[:,0] | batch.macro_bits[:,1] | batch.macro_bits[:,2]
+        _open[((_any_finished[:,None] >> np.arange(9)) & 1).astype(bool)] = 0
+
+        # directed games: only the active box stays open
+        _directed = np.nonzero(batch.active >= 0)[0]
+        _keep = _open[_directed, batch.active[_directed]]
+        _open[_directed] = 0
+        _open[_directed, batch.active[_directed]] = _keep
+        _open[batch.finished] = 0
+
+        # (N, box, bit) -> (N, box row, box col, row, col) -> (N, 9, 9)
+        _cells = _unpack[_open].reshape(-1,3,3,3,3)
+        return _cells.transpose(0,1,3,2,4).reshape(-1,9,9)
+
+    @staticmethod
+    def make_move(batch: batch_board, moves: np.array, mask: np.array = None) -> None:
+        '''
+        plays moves (N,2) for the player to move in each game
+        mask (N,) bool limits it to some games; finished games are always skipped
+        NOTE: like ops.make_move there is no legality check
+        '''
+        _live = ~batch.finished if mask is None else (mask & ~batch.finished)
+        _idx = np.nonzero(_live)[0]
+        if len(_idx) == 0:
+            return
+        _r = moves[_idx,0].astype(np.int64)
+        _c = moves[_idx,1].astype(np.int64)
+        _player = batch.n_moves[_idx] % 2
+        _box = (_r//3)*3 + _c//3
+        _bit = (1 << ((_r%3)*3 + _c%3)).astype(np.int16)
+
+        batch.hist[_idx, batch.n_moves[_idx]] = np.stack([_r, _c], axis=1)
+        batch.markers[_idx, _r, _c, _player] = True
+        batch.box_bits[_idx, _player, _box] |= _bit
+        _mine = batch.box_bits[_idx, _player, _box]
+        _taken = batch.box_bits[_idx, 0, _box] | batch.box_bits[_idx, 1, _box]
+
+        # if check line, update finished, otherwise check stale
+        _won = _line_table[_mine]
+        _stale = ~_won & (_taken == bitboard.full_box)
+        _channel = np.where(_won, _player, 2)
+        _done = _won | _stale
+        batch.macro_bits[_idx[_done], _channel[_done]] |= (1 << _box[_done]).astype(np.int16)
+        batch.miniboxes[_idx[_done], _box[_done]//3, _box[_done]%3, _channel[_done]] = True
+        batch.n_moves[_idx] += 1
+
+        # where the opponent is sent
+        _target = (_r%3)*3 + _c%3
+        _any_finished = batch.macro_bits[_idx,0] | batch.macro_bits[_idx,1] | batch.macro_bits[_idx,2]
+        batch.active[_idx] = np.where((_any_finished >> _target) & 1, -1, _target)
+
+        # game over: the mover made a line on the macro board, or every box is finished
+        _line = _line_table[batch.macro_bits[_idx, _player]]
+        _full = _any_finished == bitboard.full_box
+        batch.finished[_idx] = _line | _full
+        batch.winner[_idx] = np.where(_line, _player, np.where(_full, 2, -1))
+
+    @staticmethod
+    def check_game_finished(batch: batch_board) -> np.array:
+        return batch.finished.copy()
+
+    @staticmethod
+    def get_winner(batch: batch_board) -> np.array:
+        ''' (N,) int8: 0 agent 1 wins, 1 agent 2 wins, 2 stale, -1 ongoing '''
+        return batch.winner.copy()
+
+    @staticmethod
+    def box_winning_moves(batch: batch_board) -> np.array:
+        ''' (N,9,9) bool, legal moves that would win their box for the player to move '''
+        _player = batch.n_moves % 2
+        _mine = batch.box_bits[np.arange(batch.n_games), _player]
+        _cells = _unpack[_completer_table[_mine]].reshape(-1,3,3,3,3).transpose(0,1,3,2,4).reshape(-1,9,9)
+        return _cells & batch_ops.get_valid_mask(batch)
+
+    @staticmethod
+    def random_moves(batch: batch_board, rng: np.random.Generator, valid_mask: np.array = None) -> np.array:
+        ''' (N,2) uniformly random legal moves, (0,0) for finished games '''
+        if valid_mask is None:
+            valid_mask = batch_ops.get_valid_mask(batch)
+        _flat = valid_mask.reshape(-1,81)
+        # argmax of uniform noise over the legal cells is a uniform choice
+        _cell = np.argmax(rng.random(_flat.shape) * _flat, axis=1)
+        return np.stack([_cell//9, _cell%9], axis=1)
+
+    @staticmethod
+    def random_playouts(batch: batch_board, rng: np.random.Generator) -> np.array:
+        ''' plays every game in the batch to the end with uniformly random moves, returns the winners '''
+        while not batch.finished.all():
+            batch_ops.make_move(batch, batch_ops.random_moves(batch, rng))
+        return batch_ops.get_winner(batch)
@@ -0,0 +1,31 @@
+'''
+random-playout throughput of batch_ops against one board_obj at a time through ops
+
+run from the repo root:
+    python -m benchmarks.batch
+'''
+from time import perf_counter
+
+import numpy as np
+
+from batch import batch_board, batch_ops
+from operations import ops
+from benchmarks.bitboard import random_playouts
+
+
+def compare(n_games: int = 500, batch_sizes: tuple = (256, 4096, 16384)) -> None:
+    start = perf_counter()
+    random_playouts(ops, n_games)
+    print(f'ops one at a time   {n_games / (perf_counter() - start):10.0f} games/s')
+
+    rng = np.random.default_rng(0)
+    for n in batch_sizes:
+        batch = batch_board(n)
+        start = perf_counter()
+        batch_ops.random_playouts(batch, rng)
+        elapsed = perf_counter() - start
+        print(f'batch of {n:6d}      {n / elapsed:10.0f} games/s  ({batch.n_moves.sum() / elapsed:.0f} moves/s)')
+
+
+if __name__ == '__main__':
+    compare()
@@ -0,0 +1,60 @@
+'''
+moves/sec of the bitboard ops against the old NumPy path
+
+run from the repo root:
+    python -m benchmarks.bitboard
+'''
+import random
+from time import perf_counter
+
+from board import board_obj
+from operations import ops
+from benchmarks.numpy_reference import numpy_ops
+
+
+def random_playouts(engine, n_games: int, seed: int = 0) -> int:
+    ''' plays random games to the end, returns the number of moves made '''
+    rng = random.Random(seed)
+    n_made = 0
+    for _ in range(n_games):
+        board = board_obj()
+        while True:
+            legal_moves = engine.get_valid_moves(board)
+            engine.make_move(board, legal_moves[rng.randrange(len(legal_moves))])
+            n_made += 1
+            if engine.check_game_finished(board):
+                break
+    return n_made
+
+def make_undo_pairs(engine, n_games: int, seed: int = 0) -> int:
+    ''' from each position of random games, makes and undoes every legal move '''
+    rng = random.Random(seed)
+    n_made = 0
+    for _ in range(n_games):
+        board = board_obj()
+        while True:
+            legal_moves = engine.get_valid_moves(board)
+            for move in legal_moves:
+                engine.make_move(board, move)
+                engine.undo_move(board)
+            n_made += len(legal_moves)
+            engine.make_move(board, legal_moves[rng.randrange(len(legal_moves))])
+            if engine.check_game_finished(board):
+                break
+    return n_made
+
+def compare(n_games: int = 200) -> None:
+    for name, bench in [('random playouts', random_playouts),
+                        ('make/undo pairs', make_undo_pairs)]:
+        rates = {}
+        for engine_name, engine in [('numpy', numpy_ops), ('bitboard', ops)]:
+            start = perf_counter()
+            n_made = bench(engine, n_games)
+            rates[engine_name] = n_made / (perf_counter() - start)
+        print(f"{name:16s} numpy {rates['numpy']:10.0f} moves/s   "
+              f"bitboard {rates['bitboard']:10.0f} moves/s   "
+              f"x{rates['bitboard']/rates['numpy']:.1f}")
+
+
+if __name__ == '__main__':
+    compare()
@@ -0,0 +1,70 @@
+'''
+how root_parallel_bot throughput scales with the worker count, against one engine bot searching
+in this process (the speedups are relative to it, so they include the cost of the workers)
+
+run from the repo root:
+    python -m benchmarks.scaling
+    python -m benchmarks.scaling alphabeta
+'''
+import os
+import sys
+import random
+
+from board import board_obj
+from operations import ops
+from parallel import root_parallel_bot
+from mcts import mcts_bot
+from search import search_bot
+
+
+def positions(n_positions: int = 10, seed: int = 0) -> list:
+    ''' random early/middle game positions '''
+    rng = random.Random(seed)
+    out = []
+    while len(out) < n_positions:
+        board = board_obj()
+        for _ in range(rng.randrange(4, 30)):
+            legal_moves = ops.get_valid_moves(board)
+            ops.make_move(board, legal_moves[rng.randrange(len(legal_moves))])
+            if ops.check_game_finished(board):
+                break
+        if not ops.check_game_finished(board):
+            out.append(board)
+    return out
+
+
+def scaling(engine: str = 'mcts', thinking_time: float = 0.2, n_positions: int = 10) -> dict:
+    ''' workers -> (work per second, speedup), workers 0 is the in-process bot '''
+    boards = positions(n_positions)
+    counts = sorted({1, 2, 4, 8, 16, os.cpu_count() or 1})
+    counts = [_w for _w in counts if _w <= (os.cpu_count() or 1)]
+    unit = 'playouts' if engine == 'mcts' else 'nodes'
+
+    bot = mcts_bot(thinking_time=thinking_time) if engine == 'mcts' else search_bot(thinking_time=thinking_time)
+    work, seconds = 0, 0.0
+    for board in boards:
+        bot.get_best_move(board)
+        work += bot.playouts if engine == 'mcts' else bot.nodes
+        seconds += bot.elapsed
+    base = work / seconds
+    out = {0: (base, 1.0)}
+    print(f'in process   {base:12.0f} {unit}/s')
+    for workers in counts:
+        bot = root_parallel_bot(workers=workers, thinking_time=thinking_time, engine=engine)
+        bot.start()
+        work, seconds, worst = 0, 0.0, 0.0
+        for board in boards:
+            bot.get_best_move(board)
+            work += bot.work
+            seconds += bot.elapsed
+            worst = max(worst, bot.elapsed)
+        bot.close()
+        rate = work / seconds
+        out[workers] = (rate, rate / base)
+        print(f'{workers:3d} workers  {rate:12.0f} {unit}/s  speedup x{rate/base:5.2f}  '
+              f'slowest move {worst:.3f}s (budget {thinking_time}s)')
+    return out
+
+
+if __name__ == '__main__':
+    scaling(*sys.argv[1:2])
@@ -0,0 +1,224 @@
+'''
+throughput of the engine primitives on fixed position corpora, saved as JSON
+
+corpora (positions of seeded random games, the same on every run):
+    early     4-15 moves played
+    mid       16-40 moves played
+    late      more than 40 moves played
+    anywhere  the player to move may play in any box
+
+run from the repo root:
+    python -m benchmarks.suite --out results.json
+    python -m benchmarks.suite --compare results.json           # flags regressions against a saved run
+    python -m benchmarks.suite --out new.json --compare old.json --threshold 0.15
+the exit code is 1 when a benchmark regressed; rates are the best of several runs, on a busy
+machine they still move by 10-20%, raise --threshold/--repeats there
+'''
+import argparse
+import hashlib
+import json
+import platform
+import random
+import sys
+from datetime import datetime
+from time import perf_counter
+
+import numpy as np
+
+from board import board_obj
+from operations import ops
+from line_completer import line_completer_bot, fast_line_completer_bot
+
+phases = {'early': lambda _b: 4 <= _b.n_moves <= 15,
+          'mid': lambda _b: 16 <= _b.n_moves <= 40,
+          'late': lambda _b: _b.n_moves > 40,
+          'anywhere': lambda _b: _b.n_moves > 0 and _b.active < 0}
+
+def corpora(n_positions: int = 200, seed: int = 0) -> dict:
+    ''' phase -> list of move histories, n_positions each, from seeded random games '''
+    rng = random.Random(seed)
+    out = {_phase: [] for _phase in phases}
+    while any(len(_positions) < n_positions for _positions in out.values()):
+        board = board_obj()
+        moves = []
+        taken = set() # at most one position per phase and game keeps the corpora spread over many games
+        while not (board.n_moves and ops.check_game_finished(board)):
+            for phase, test in phases.items():
+                if phase not in taken and len(out[phase]) < n_positions and test(board) and rng.random() < 0.1:
+                    out[phase].append(list(moves))
+                    taken.add(phase)
+            legal_moves = ops.get_valid_moves(board)
+            move = legal_moves[rng.randrange(len(legal_moves))]
+            ops.make_move(board, move)
+            moves.append(move)
+    return out
+
+def corpus_hash(histories: dict) -> str:
+    ''' fingerprint of the corpora, results are only comparable between equal corpora '''
+    return hashlib.sha1(json.dumps(histories, sort_keys=True).encode()).hexdigest()[:12]
+
+def _boards(histories: list) -> list:
+    boards = []
+    for moves in histories:
+        board = board_obj()
+        for move in moves:
+            ops.make_move(board, move)
+        boards.append(board)
+    return boards
+
+def _rate(fn, min_time: float, repeats: int) -> float:
+    ''' best of repeats: fn() returns the number of operations it did, run until min_time has passed '''
+    best = 0.0
+    for _ in range(repeats):
+        n_ops = 0
+        start = perf_counter()
+        while True:
+            n_ops += fn()
+            elapsed = perf_counter() - start
+            if elapsed >= min_time:
+                break
+        best = max(best, n_ops / elapsed)
+    return best
+
+''' ------------------ benchmarks, each returns the number of operations done ---------------- '''
+
+def bench_make_undo(boards: list) -> int:
+    n_ops = 0
+    for board in boards:
+        for move in ops.get_valid_moves(board):
+            ops.make_move(board, move)
+            ops.undo_move(board)
+            n_ops += 1
+    return n_ops
+
+def bench_get_valid_moves(boards: list) -> int:
+    for board in boards:
+        ops.get_valid_moves(board)
+    return len(boards)
+
+def bench_check_game_finished(boards: list) -> int:
+    for board in boards:
+        ops.check_game_finished(board)
+    return len(boards)
+
+def _bench_pull(boards: list, pull) -> int:
+    '''
+    pull and read the keys a typical bot reads after every legal move of every board, as a game
+    does once per turn (every pull is of a new position, nothing is served from an earlier one)
+    '''
+    n_ops = 0
+    for board in boards:
+        legal_moves = ops.get_valid_moves(board)
+        if len(legal_moves) < 2:
+            continue # the same position on every run
+        for move in legal_moves:
+            ops.make_move(board, move)
+            board_dict = pull(board)
+            board_dict['board_state'], board_dict['active_box'], board_dict['valid_moves']
+            ops.undo_move(board)
+            n_ops += 1
+    return n_ops
+
+def bench_pull_dictionary(boards: list) -> int:
+    return _bench_pull(boards, ops.pull_dictionary)
+
+def bench_pull_view(boards: list) -> int:
+    return _bench_pull(boards, ops.pull_view)
+
+def bench_random_playouts(boards: list, rng: random.Random) -> int:
+    ''' plays each position out with random moves and takes them back, counts moves '''
+    n_ops = 0
+    for board in boards:
+        n_made = 0
+        while not ops.check_game_finished(board):
+            legal_moves = ops.get_valid_moves(board)
+            ops.make_move(board, legal_moves[rng.randrange(len(legal_moves))])
+            n_made += 1
+        for _ in range(n_made):
+            ops.undo_move(board)
+        n_ops += n_made
+    return n_ops
+
+def bench_bot(bot, dicts: list) -> int:
+    for board_dict in dicts:
+        bot.move(board_dict)
+    return len(dicts)
+
+def run(n_positions: int = 200, seed: int = 0, min_time: float = 0.3, repeats: int = 5) -> dict:
+    ''' every benchmark on every corpus, rates in operations per second '''
+    histories = corpora(n_positions, seed)
+    results = {}
+    for phase, phase_histories in histories.items():
+        boards = _boards(phase_histories)
+        dicts = [ops.pull_dictionary(_board) for _board in boards]
+        rng = random.Random(seed)
+        np.random.seed(seed)
+        slow_bot, fast_bot = line_completer_bot(), fast_line_completer_bot()
+        benches = {'make_undo': (lambda: bench_make_undo(boards), 'moves/s'),
+                   'get_valid_moves': (lambda: bench_get_valid_moves(boards), 'calls/s'),
+                   'check_game_finished': (lambda: bench_check_game_finished(boards), 'calls/s'),
+                   'pull_dictionary': (lambda: bench_pull_dictionary(boards), 'calls/s'),
+                   'pull_view': (lambda: bench_pull_view(boards), 'calls/s'),
+                   'random_playouts': (lambda: bench_random_playouts(boards, rng), 'moves/s'),
+                   'line_completer_bot.move': (lambda: bench_bot(slow_bot, dicts), 'moves/s'),
+                   'fast_line_completer_bot.move': (lambda: bench_bot(fast_bot, dicts), 'moves/s')}
+        for name, (fn, unit) in benches.items():
+            results[f'{phase}/{name}'] = {'rate': _rate(fn, min_time, repeats), 'unit': unit}
+    return {'meta': {'date': datetime.now().isoformat(timespec='seconds'),
+                     'python': platform.python_version(),
+                     'numpy': np.__version__,
+                     'machine': platform.machine(),
+                     'corpus': corpus_hash(histories),
+                     'n_positions': n_positions,
+                     'seed': seed},
+            'results': results}
+
+def compare(new: dict, old: dict, threshold: float = 0.1) -> list:
+    ''' prints new against old, returns the names of the benchmarks that got slower by more than threshold '''
+    if new['meta']['corpus'] != old['meta']['corpus']:
+        print(f"warning: different corpora ({old['meta']['corpus']} vs {new['meta']['corpus']}), rates may not be comparable")
+    regressions = []
+    print(f"{'benchmark':44s}{'old':>14s}{'new':>14s}{'change':>9s}")
+    for name, result in new['results'].items():
+        if name not in old['results']:
+            print(f"{name:44s}{'-':>14s}{result['rate']:>14.0f}")
+            continue
+        ratio = result['rate'] / old['results'][name]['rate']
+        flag = ''
+        if ratio < 1 - threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f"{name:44s}{old['results'][name]['rate']:>14.0f}{result['rate']:>14.0f}{ratio - 1:>+9.1%}{flag}")
+    return regressions
+
+def format_results(results: dict) -> str:
+    return '\n'.join(f"{_name:44s}{_result['rate']:>14.0f} {_result['unit']}" for _name, _result in results['results'].items())
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description='benchmark the engine primitives')
+    parser.add_argument('--out', help='save the results to this JSON file')
+    parser.add_argument('--compare', help='JSON results of an earlier run to compare against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='slowdown that counts as a regression (0.1 = 10%%)')
+    parser.add_argument('--positions', type=int, default=200, help='positions per corpus')
+    parser.add_argument('--min-time', type=float, default=0.3, help='seconds per measurement')
+    parser.add_argument('--repeats', type=int, default=5, help='measurements per benchmark, the best is kept')
+    args = parser.parse_args(argv)
+
+    results = run(args.positions, min_time=args.min_time, repeats=args.repeats)
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(results, f, indent=1)
+    if not args.compare:
+        print(format_results(results))
+        return 0
+    with open(args.compare) as f:
+        old = json.load(f)
+    regressions = compare(results, old, args.threshold)
+    if regressions:
+        print(f'{len(regressions)} regression(s) beyond {args.threshold:.0%}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,83 @@
+'''
+bitboard layout and lookup tables used by ops
+
+a cell (r,c) on the 9x9 board is stored as the flat index r*9 + c
+it lives in box (r//3)*3 + c//3, at bit (r%3)*3 + c%3 of that box's 9-bit int
+the macro board uses the same 9-bit layout, one bit per box
+
+everything here is built once at import, the hot paths only index into lists
+'''
+import numpy as np
+
+full_box = 0b111111111
+
+# the eight winning patterns of a 3x3 box, same order as ops.lines_mask
+lines = (0b000000111, 0b000111000, 0b111000000, # horizontals
+         0b001001001, 0b010010010, 0b100100100, # verticals
+         0b100010001, 0b001010100)              # diagonals
+
+# ---- cell <-> box translation ----
+cell_pos = [(_i//9, _i%9) for _i in range(81)]
+cell_box = [(_i//27)*3 + (_i%9)//3 for _i in range(81)]
+cell_bit = [1 << (((_i//9)%3)*3 + _i%3) for _i in range(81)]
+
+# the box a move sends the opponent to (the relative position of the cell in its box)
+cell_target = [((_i//9)%3)*3 + _i%3 for _i in range(81)]
+
+# box_cells[box][bit index] -> flat cell index
+box_cells = [[(_b//3*3 + _k//3)*9 + _b%3*3 + _k%3 for _k in range(9)] for _b in range(9)]
+
+# box_moves[box][mask] -> tuple of (r,c) moves for the set bits of mask, in row-major order
+box_moves = [[tuple(cell_pos[box_cells[_b][_k]] for _k in range(9) if _m >> _k & 1)
+              for _m in range(512)] for _b in range(9)]
+
+# ---- 512-entry line tables, indexed by the 9-bit occupancy of one player in a box ----
+# (they work the same on the macro board)
+
+# line_table[mask] -> does mask contain a line?
+line_table = [any((_m & _line) == _line for _line in lines) for _m in range(512)]
+
+# completer_table[mask] -> cells (as a 9-bit mask) that would complete a line for the owner of mask
+# AND the result with the empty cells of the box before using it
+completer_table = [sum(1 << _k for _k in range(9)
+                       if not _m >> _k & 1 and line_table[_m | 1 << _k]) for _m in range(512)]
+
+# open_lines_table[mask] -> 8-bit mask of the lines (in the order of `lines`) that mask doesn't touch
+# with the opponent's occupancy this gives the lines still open to a player
+open_lines_table = [sum(1 << _l for _l, _line in enumerate(lines) if not _m & _line) for _m in range(512)]
+
+# mask_cells[mask] -> the (row, col) positions inside a 3x3 box of the set bits, row-major
+mask_cells = [tuple((_k//3, _k%3) for _k in range(9) if _m >> _k & 1) for _m in range(512)]
+
+box_weights = (1 << np.arange(9)).reshape(3,3)
+
+def to_mask(box: np.array) -> int:
+    ''' converts a (3,3) boolean array to its 9-bit mask '''
+    return int(box_weights[box].sum())
+
+# ---- 81-bit row-major masks (bit r*9 + c) for "play anywhere" move generation ----
+
+# box_spread[box][mask] -> the 9-bit box mask placed on the 81-bit board
+box_spread = [[sum(1 << box_cells[_b][_k] for _k in range(9) if _m >> _k & 1) for _m in range(512)]
+              for _b in range(9)]
+
+# row_moves[row][mask] -> tuple of (r,c) moves for a 9-bit slice (one full row) of an 81-bit mask
+row_moves = [[tuple((_r, _c) for _c in range(9) if _m >> _c & 1) for _m in range(512)] for _r in range(9)]
+
+# ---- symmetries: the 8 rotations/reflections of the 9x9 grid ----
+# each one sends boxes to boxes and moves the cells inside every box the same way
+
+def _sym_pos(k: int, r: int, c: int, n: int) -> tuple:
+    # reflection first for k >= 4, then k%4 quarter turns, on an n x n grid
+    if k >= 4:
+        c = n - 1 - c
+    for _ in range(k%4):
+        r, c = c, n - 1 - r
+    return r, c
+
+# sym_cells[k][cell] -> cell, sym_boxes[k][box] -> box (the same map for bits inside a box)
+sym_cells = [tuple(_p[0]*9 + _p[1] for _p in (_sym_pos(_k, _i//9, _i%9, 9) for _i in range(81))) for _k in range(8)]
+sym_boxes = [tuple(_p[0]*3 + _p[1] for _p in (_sym_pos(_k, _i//3, _i%3, 3) for _i in range(9))) for _k in range(8)]
+# sym_inverse[k] undoes symmetry k
+sym_inverse = [next(_j for _j in range(8) if all(sym_cells[_j][sym_cells[_k][_i]] == _i for _i in range(81)))
+               for _k in range(8)]
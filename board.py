@@ -1,5 +1,5 @@
-
 import numpy as np
+import zobrist
 
 
 class board_obj():
@@ -7,16 +7,215 @@ class board_obj():
         # the full board: two channels, one per player
         self.markers = np.zeros((9,9,2)).astype(bool)
         # an "open" location is calculated by ORing
-        
+
         # the overall miniboard status
         self.miniboxes = np.zeros((3,3,3)).astype(bool)
         # channels: p1, p2, stale
-        
+
         # board history
         self.hist = np.zeros((81,2),dtype=np.uint8)
         self.n_moves = 0
+
+        # bitboards (see bitboard.py), these are what ops reads
+        # the arrays above are kept in sync for bots and plotting
+        self.box_bits = [[0]*9, [0]*9] # one 9-bit int per player per box
+        self.macro_bits = [0, 0, 0]    # one 9-bit int per channel: p1, p2, stale
+
+        # legal move state, updated incrementally by ops.make_move/undo_move
+        self.open_bits = [0b111111111]*9 # empty cells per box
+        self.legal_bits = (1 << 81) - 1  # empty cells of unfinished boxes, bit r*9 + c ("play anywhere")
+        self.active = -1                 # box the player to move is sent to, -1 is anywhere
+
+        # one undo record (a small int, see ops._place) per move played
+        self.undo_stack = [0]*81
+
+        # 64-bit zobrist key of the position (see zobrist.py)
+        self.key = zobrist.start_key
+
+        # evaluation.evaluator kept up to date by ops.make_move/undo_move, if one is attached
+        self.evaluator = None
+
+        # the live operations.board_view of this board, made by the first ops.pull_view
+        self.view = None
+
     def build_from_dict_gamestate(self, gamestate: dict):
         self.markers = gamestate['markers']
         self.miniboxes = gamestate['miniboxes']
         self.hist = gamestate['history']
-        self.n_moves = gamestate['n_moves']
\ No newline at end of file
+        self.n_moves = gamestate['n_moves']
+        source = getattr(gamestate, 'board', None)
+        if isinstance(source, (board_obj, compact_board)):
+            # a board_view (ops.pull_view): copy the bitboards instead of replaying
+            self.box_bits = [source.box_bits[0][:], source.box_bits[1][:]]
+            self.macro_bits = source.macro_bits[:]
+            self.open_bits = source.open_bits[:]
+            self.legal_bits = source.legal_bits
+            self.active = source.active
+            self.undo_stack = source.undo_stack[:]
+            self.key = source.key
+            return
+        # the bitboards are derived from the history
+        from operations import ops # local import, operations depends on this module
+        ops.sync_bits(self)
+
+
+# compact_board buffer layout: markers (9,9,2) bool | miniboxes (3,3,3) bool | one cell byte per move
+_markers_end = 162
+_miniboxes_end = _markers_end + 27
+_buffer_size = _miniboxes_end + 81
+
+# cell -> (row, col)
+_cell_pairs = np.array([(_c//9, _c%9) for _c in range(81)], dtype=np.uint8)
+
+class move_history:
+    '''
+    (81, 2) row/col view of compact_board's one byte per move history
+    reads give (row, col) arrays like board_obj.hist, writes take a move (or 0, as undo_move does)
+    '''
+    __slots__ = ('cells',)
+
+    def __init__(self, cells: np.array) -> None:
+        self.cells = cells
+
+    def __getitem__(self, idx):
+        if type(idx) is int:
+            return _cell_pairs[self.cells[idx]]
+        return _cell_pairs[self.cells][idx]
+
+    def __setitem__(self, idx, move) -> None:
+        if type(move) is tuple:
+            self.cells[idx] = int(move[0])*9 + int(move[1])
+        elif np.ndim(move) == 0:
+            self.cells[idx] = move
+        else:
+            self.cells[idx] = int(move[0])*9 + int(move[1])
+
+    def __len__(self) -> int:
+        return 81
+
+    def __array__(self, dtype=None, copy=None):
+        out = _cell_pairs[self.cells]
+        return out if dtype is None else out.astype(dtype)
+
+class compact_board:
+    '''
+    board_obj with __slots__ and one 270 byte buffer: markers and miniboxes are numpy views into it,
+    the history is one byte per move (cells, row*9 + col; hist reads it as (row, col) pairs)
+    every ops function takes it in place of a board_obj
+
+    clone() and copy_into() cost the same whatever the game length: one buffer copy plus the few
+    small bitboard lists, copy_into() reuses the target's buffer and lists (no allocation), for
+    search nodes that snapshot positions
+    snapshot() is the position as 271 bytes (n_moves + buffer), from_snapshot() rebuilds it, to keep
+    millions of positions in memory
+    '''
+    __slots__ = ('buffer', 'markers', 'miniboxes', 'cells', 'hist', 'n_moves',
+                 'box_bits', 'macro_bits', 'open_bits', 'legal_bits', 'active', 'undo_stack', 'key', 'evaluator', 'view')
+
+    def __init__(self) -> None:
+        self._views(np.zeros(_buffer_size, dtype=np.uint8))
+        self.n_moves = 0
+        self.box_bits = [[0]*9, [0]*9]
+        self.macro_bits = [0, 0, 0]
+        self.open_bits = [0b111111111]*9
+        self.legal_bits = (1 << 81) - 1
+        self.active = -1
+        self.undo_stack = [0]*81
+        self.key = zobrist.start_key
+        self.evaluator = None
+        self.view = None
+
+    def _views(self, buffer: np.array) -> None:
+        self.buffer = buffer
+        self.markers = buffer[:_markers_end].view(bool).reshape(9,9,2)
+        self.miniboxes = buffer[_markers_end:_miniboxes_end].view(bool).reshape(3,3,3)
+        self.cells = buffer[_miniboxes_end:]
+        self.hist = move_history(self.cells)
+
+    def clone(self) -> 'compact_board':
+        ''' independent copy of the position (no evaluator attached) '''
+        out = compact_board.__new__(compact_board)
+        out._views(self.buffer.copy())
+        out.n_moves = self.n_moves
+        out.box_bits = [self.box_bits[0][:], self.box_bits[1][:]]
+        out.macro_bits = self.macro_bits[:]
+        out.open_bits = self.open_bits[:]
+        out.legal_bits = self.legal_bits
+        out.active = self.active
+        out.undo_stack = self.undo_stack[:]
+        out.key = self.key
+        out.evaluator = None
+        out.view = None
+        return out
+
+    # copies go through clone(): copying the arrays one by one would split the views from the buffer
+    def __copy__(self) -> 'compact_board':
+        return self.clone()
+
+    def __deepcopy__(self, memo: dict) -> 'compact_board':
+        return self.clone()
+
+    def __reduce__(self):
+        return (compact_board.from_snapshot, (self.snapshot(),))
+
+    def copy_into(self, other: 'compact_board') -> 'compact_board':
+        ''' overwrites other with this position in place, returns other (its evaluator is detached) '''
+        other.buffer[:] = self.buffer
+        other.n_moves = self.n_moves
+        other.box_bits[0][:] = self.box_bits[0]
+        other.box_bits[1][:] = self.box_bits[1]
+        other.macro_bits[:] = self.macro_bits
+        other.open_bits[:] = self.open_bits
+        other.legal_bits = self.legal_bits
+        other.active = self.active
+        other.undo_stack[:] = self.undo_stack
+        other.key = self.key
+        other.evaluator = None
+        return other
+
+    def snapshot(self) -> bytes:
+        return bytes((self.n_moves,)) + self.buffer.tobytes()
+
+    @staticmethod
+    def from_snapshot(data: bytes) -> 'compact_board':
+        ''' the board of a snapshot(), the bitboards are rebuilt from its history '''
+        board = compact_board()
+        board.buffer[:] = np.frombuffer(data, dtype=np.uint8, count=_buffer_size, offset=1)
+        board.n_moves = data[0]
+        from operations import ops # local import, operations depends on this module
+        ops.sync_bits(board)
+        return board
+
+    @staticmethod
+    def from_board(board) -> 'compact_board':
+        ''' compact copy of a board_obj (or compact_board) '''
+        out = compact_board()
+        out.markers[:] = board.markers
+        out.miniboxes[:] = board.miniboxes
+        _hist = np.asarray(board.hist[:board.n_moves], dtype=np.int64)
+        out.cells[:board.n_moves] = _hist[:, 0]*9 + _hist[:, 1]
+        out.n_moves = board.n_moves
+        out.box_bits = [board.box_bits[0][:], board.box_bits[1][:]]
+        out.macro_bits = board.macro_bits[:]
+        out.open_bits = board.open_bits[:]
+        out.legal_bits = board.legal_bits
+        out.active = board.active
+        out.undo_stack = board.undo_stack[:]
+        out.key = board.key
+        return out
+
+    def build_from_dict_gamestate(self, gamestate) -> None:
+        ''' as board_obj.build_from_dict_gamestate, but the arrays are copied into the buffer '''
+        source = getattr(gamestate, 'board', None)
+        if isinstance(source, (board_obj, compact_board)):
+            # a board_view (ops.pull_view): copy the live board
+            compact_board.from_board(source).copy_into(self)
+            return
+        self.markers[:] = gamestate['markers']
+        self.miniboxes[:] = gamestate['miniboxes']
+        self.n_moves = gamestate['n_moves']
+        _hist = np.asarray(gamestate['history'], dtype=np.int64)[:self.n_moves]
+        self.cells[:] = 0
+        self.cells[:self.n_moves] = _hist[:, 0]*9 + _hist[:, 1]
+        from operations import ops # local import, operations depends on this module
+        ops.sync_bits(self)
@@ -0,0 +1,323 @@
+'''
+opening book and exact endgame solver
+
+opening_book: best moves of early positions, found offline by deep search (build_book)
+    positions are keyed by a canonical hash, the smallest of the 8 symmetric versions of the
+    position, so one entry covers every rotation/reflection; the move is stored in the canonical
+    orientation and mapped back on lookup
+    on disk: {path}.keys.npy (sorted uint64) and {path}.entries.npy (move, depth, score), both
+    memory mapped, a lookup is one binary search
+
+endgame_solver: exact win/draw/loss search once at most max_empty cells are open
+    every exactly solved position goes into a cache keyed by board.key (the zobrist keys are
+    seeded, so they are the same between runs); save() merges it into {path}.keys.npy /
+    {path}.values.npy, which later runs load memory mapped
+    the bots give it endgame_share of their thinking_time, a solve that doesn't finish in time
+    gives up (only the positions it finished are cached) and the bot searches as usual
+
+    book = opening_book('uttt_book')
+    endgame = endgame_solver(max_empty=14, path='uttt_endgame')
+    bot = search_bot(book=book, endgame=endgame)
+    ...
+    endgame.save()
+'''
+import os
+import multiprocessing
+from itertools import islice
+from time import perf_counter
+
+import numpy as np
+
+import bitboard
+import zobrist
+from board import board_obj
+from operations import ops
+
+# share of a bot's thinking_time the endgame solver may use, the bot searches in the rest if it gives up
+endgame_share = 0.5
+
+_entry_dtype = np.dtype([('move', 'u1'), ('depth', 'u1'), ('score', '<i4')])
+
+# _sym_keys[k][player][box][mask] -> XOR of the cell keys of mask's cells after symmetry k
+_sym_keys = [[[[0]*512 for _ in range(9)] for _ in range(2)] for _ in range(8)]
+for _k in range(8):
+    for _p in range(2):
+        for _b in range(9):
+            _table = _sym_keys[_k][_p][_b]
+            for _m in range(1, 512):
+                _low = _m & -_m
+                _cell = bitboard.sym_cells[_k][bitboard.box_cells[_b][_low.bit_length()-1]]
+                _table[_m] = _table[_m ^ _low] ^ zobrist.cell_keys[_p][_cell]
+del _k, _p, _b, _m, _low, _cell, _table
+
+def canonical_key(board: board_obj) -> tuple:
+    '''
+    (key, k): the smallest hash over the 8 symmetric versions of the position and the symmetry
+    that gives it; cells and the active box decide the position, finished boxes follow from the cells
+    '''
+    p1, p2 = board.box_bits
+    best_key, best_k = None, 0
+    for _k in range(8):
+        _keys1, _keys2 = _sym_keys[_k]
+        _key = zobrist.active_keys[bitboard.sym_boxes[_k][board.active] + 1 if board.active >= 0 else 0]
+        for _b in range(9):
+            _key ^= _keys1[_b][p1[_b]] ^ _keys2[_b][p2[_b]]
+        if best_key is None or _key < best_key:
+            best_key, best_k = _key, _k
+    return best_key, best_k
+
+def _finished_value(board: board_obj) -> int:
+    ''' value of a finished game for the player to move: the last mover made the line, or a draw '''
+    return -1 if bitboard.line_table[board.macro_bits[(board.n_moves-1)%2]] else 0
+
+def known_move(board: board_obj, book: 'opening_book' = None, endgame: 'endgame_solver' = None,
+               time_budget: float = None) -> tuple:
+    '''
+    the book move, or the solved move once the endgame solver applies, None if neither knows board
+    time_budget: seconds the solver may take, None if it can't solve board in that time
+    '''
+    if book is not None:
+        move = book.move(board)
+        if move is not None:
+            return move
+    if endgame is not None and endgame.applies(board):
+        return endgame.best_move(board, time_budget)[0]
+    return None
+
+''' ------------------ opening book ---------------- '''
+
+class opening_book:
+    ''' read only, memory mapped book built by build_book '''
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.keys = np.load(path + '.keys.npy', mmap_mode='r')
+        self.entries = np.load(path + '.entries.npy', mmap_mode='r')
+        self.hits = 0
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    def __reduce__(self):
+        # reopened from the files in other processes (see parallel.py)
+        return (opening_book, (self.path,))
+
+    def lookup(self, board: board_obj):
+        ''' the book entry (move, depth, score) of board or None, move is in board's orientation '''
+        key, k = canonical_key(board)
+        idx = int(np.searchsorted(self.keys, np.uint64(key)))
+        if idx == len(self.keys) or int(self.keys[idx]) != key:
+            return None
+        move, depth, score = self.entries[idx]
+        return bitboard.cell_pos[bitboard.sym_cells[bitboard.sym_inverse[k]][move]], int(depth), int(score)
+
+    def move(self, board: board_obj) -> tuple:
+        ''' the book move of board, None when it isn't in the book '''
+        entry = self.lookup(board)
+        if entry is None or not ops.check_move_is_valid(board, entry[0]):
+            return None
+        self.hits += 1
+        return entry[0]
+
+def book_positions(max_plies: int) -> list:
+    ''' histories (bytes of cells) of one position per symmetry class, up to max_plies moves in '''
+    frontier = [board_obj()]
+    histories = [b'']
+    for _ in range(max_plies):
+        seen = set()
+        next_frontier = []
+        for board in frontier:
+            for move in ops.get_valid_moves(board):
+                ops.make_move(board, move)
+                key, _ = canonical_key(board)
+                if key not in seen and not ops.check_game_finished(board):
+                    seen.add(key)
+                    child = board_obj()
+                    for _move in board.hist[:board.n_moves]:
+                        ops.make_move(child, (int(_move[0]), int(_move[1])))
+                    next_frontier.append(child)
+                ops.undo_move(board)
+        frontier = next_frontier
+        histories += [bytes(int(_m[0])*9 + int(_m[1]) for _m in _b.hist[:_b.n_moves]) for _b in frontier]
+    return histories
+
+def _book_entry(args: tuple) -> tuple:
+    ''' worker: deep search of one position, returns (canonical key, canonical move, depth, score) '''
+    from search import search_bot # local import, search.py imports this module
+    history, thinking_time, max_depth = args
+    board = board_obj()
+    for _cell in history:
+        ops.make_move(board, bitboard.cell_pos[_cell])
+    bot = search_bot(thinking_time=thinking_time, max_depth=max_depth)
+    move = bot.get_best_move(board)
+    key, k = canonical_key(board)
+    return key, bitboard.sym_cells[k][move[0]*9 + move[1]], bot.reached_depth, bot.score
+
+def build_book(path: str, max_plies: int = 3, thinking_time: float = 1.0, max_depth: int = 81, n_jobs: int = None) -> int:
+    '''
+    searches every position up to max_plies moves in (one per symmetry class) and writes the book
+    n_jobs processes (default: all cores), returns the number of entries
+    '''
+    n_jobs = n_jobs or os.cpu_count() or 1
+    tasks = [(_history, thinking_time, max_depth) for _history in book_positions(max_plies)]
+    if n_jobs == 1:
+        results = [_book_entry(_task) for _task in tasks]
+    else:
+        with multiprocessing.get_context().Pool(n_jobs) as pool:
+            results = pool.map(_book_entry, tasks)
+
+    results.sort()
+    keys = np.array([_r[0] for _r in results], dtype=np.uint64)
+    entries = np.array([_r[1:] for _r in results], dtype=_entry_dtype)
+    np.save(path + '.keys.npy', keys)
+    np.save(path + '.entries.npy', entries)
+    return len(keys)
+
+''' ------------------ endgame solver ---------------- '''
+
+class endgame_solver:
+    '''
+    exact search for positions with at most max_empty open cells
+    values are from the view of the player to move: 1 win, 0 draw, -1 loss
+    cache_size: solved positions kept in memory, past it the oldest half is dropped (so between
+                two save() calls only the newest results are saved)
+    '''
+    def __init__(self, max_empty: int = 14, path: str = None, cache_size: int = 1000000) -> None:
+        self.max_empty = max_empty
+        self.path = path
+        self.cache_size = cache_size
+        self.cache = {}   # board.key -> exact value, solved since the last save
+        self.bounds = {}  # board.key -> (lower, upper), only during one solve
+        self.nodes = 0
+        self.hits = 0
+        self.deadline = None # perf_counter time the current solve gives up at, None is no limit
+        self.stopped = False
+        self.stored_keys = np.zeros(0, dtype=np.uint64)
+        self.stored_values = np.zeros(0, dtype=np.int8)
+        if path is not None and os.path.exists(path + '.keys.npy'):
+            self.stored_keys = np.load(path + '.keys.npy', mmap_mode='r')
+            self.stored_values = np.load(path + '.values.npy', mmap_mode='r')
+
+    def __reduce__(self):
+        # only the saved cache travels to other processes
+        return (endgame_solver, (self.max_empty, self.path, self.cache_size))
+
+    def applies(self, board: board_obj) -> bool:
+        ''' True for unfinished positions with at most max_empty open cells '''
+        return board.legal_bits.bit_count() <= self.max_empty and not (board.n_moves and ops.check_game_finished(board))
+
+    def best_move(self, board: board_obj, time_budget: float = None) -> tuple:
+        '''
+        (move, value) of an unfinished position, a win is played as soon as one is found
+        (None, None) if it isn't solved within time_budget seconds
+        '''
+        self._start(time_budget)
+        best_move, best_value = None, -2
+        for move in self._ordered_moves(board):
+            ops.make_move(board, move)
+            value = -self._solve(board, -1, -max(best_value, -1))
+            ops.undo_move(board)
+            if self.stopped:
+                self._trim_cache()
+                return None, None
+            if value > best_value:
+                best_move, best_value = move, value
+                if value == 1:
+                    break
+        self.hits += 1
+        self._trim_cache()
+        return best_move, best_value
+
+    def solve(self, board: board_obj, time_budget: float = None) -> int:
+        ''' exact value of the position for the player to move, None if it isn't solved within time_budget seconds '''
+        self._start(time_budget)
+        value = self._solve(board, -1, 1)
+        self._trim_cache()
+        return None if self.stopped else value
+
+    def _start(self, time_budget: float) -> None:
+        self.bounds.clear()
+        self.stopped = False
+        self.deadline = None if time_budget is None else perf_counter() + time_budget
+
+    def _trim_cache(self) -> None:
+        # dicts keep insertion order, the oldest results go first
+        if len(self.cache) > self.cache_size:
+            for _key in list(islice(self.cache, len(self.cache) - self.cache_size//2)):
+                del self.cache[_key]
+
+    def _stored(self, key: int):
+        _idx = int(np.searchsorted(self.stored_keys, np.uint64(key)))
+        if _idx < len(self.stored_keys) and int(self.stored_keys[_idx]) == key:
+            return int(self.stored_values[_idx])
+        return None
+
+    def _solve(self, board: board_obj, alpha: int, beta: int) -> int:
+        ''' fail soft negamax over the values -1, 0, 1, returns 0 once stopped (callers check self.stopped) '''
+        self.nodes += 1
+        if self.deadline is not None and not self.nodes & 127 and perf_counter() > self.deadline:
+            self.stopped = True
+        if self.stopped:
+            return 0
+        if board.n_moves and ops.check_game_finished(board):
+            return _finished_value(board)
+        key = board.key
+        value = self.cache.get(key)
+        if value is None and len(self.stored_keys):
+            value = self._stored(key)
+        if value is not None:
+            return value
+        lower, upper = self.bounds.get(key, (-1, 1))
+        if lower >= beta:
+            return lower
+        if upper <= alpha:
+            return upper
+        alpha, beta = max(alpha, lower), min(beta, upper)
+
+        alpha_orig = alpha
+        best_value = -2
+        for move in self._ordered_moves(board):
+            ops.make_move(board, move)
+            value = -self._solve(board, -beta, -alpha)
+            ops.undo_move(board)
+            if self.stopped:
+                return 0 # unfinished, nothing is stored
+            if value > best_value:
+                best_value = value
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        break
+
+        # 1 and -1 are exact whatever the window, 0 only inside it
+        if best_value != 0 or alpha_orig < 0 < beta:
+            self.cache[key] = best_value
+        elif best_value >= beta:
+            self.bounds[key] = (best_value, upper)
+        else:
+            self.bounds[key] = (lower, best_value)
+        return best_value
+
+    @staticmethod
+    def _ordered_moves(board: board_obj) -> list:
+        ''' moves that win their box first '''
+        own_bits = board.box_bits[board.n_moves%2]
+        moves = ops.get_valid_moves(board)
+        moves.sort(key=lambda _m: not bitboard.completer_table[own_bits[bitboard.cell_box[_m[0]*9 + _m[1]]]]
+                                      & bitboard.cell_bit[_m[0]*9 + _m[1]])
+        return moves
+
+    def save(self) -> None:
+        ''' merges the new results into the files at path '''
+        if self.path is None:
+            raise ValueError('endgame_solver has no path to save to')
+        keys = np.concatenate([np.asarray(self.stored_keys), np.fromiter(self.cache.keys(), dtype=np.uint64, count=len(self.cache))])
+        values = np.concatenate([np.asarray(self.stored_values), np.fromiter(self.cache.values(), dtype=np.int8, count=len(self.cache))])
+        keys, first = np.unique(keys, return_index=True)
+        values = values[first]
+        # write then rename, the old files may still be mapped
+        for name, array in (('.keys.npy', keys), ('.values.npy', values)):
+            np.save(self.path + name + '.tmp.npy', array)
+            os.replace(self.path + name + '.tmp.npy', self.path + name)
+        self.stored_keys = np.load(self.path + '.keys.npy', mmap_mode='r')
+        self.stored_values = np.load(self.path + '.values.npy', mmap_mode='r')
+        self.cache.clear()
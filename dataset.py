@@ -0,0 +1,208 @@
+'''
+training data: positions from game logs (see gamelog.py) as fixed layout feature tensors
+
+every position a move was played from becomes one sample, seen from the player to move:
+    x      6 planes of 81 cells (row-major), uint8 0/1
+               0 own markers          1 opponent markers
+               2 boxes won by the player to move
+               3 boxes won by the opponent
+               4 stale boxes          5 legal moves
+           packed=True stores the 486 bits with np.packbits, 61 bytes per position
+    value  int8, final result for the player to move: 1 win, -1 loss, 0 draw
+    move   uint8, cell of the move that was played (the policy target)
+unfinished games are skipped
+
+the 8 rotations/reflections of the 9x9 grid map boxes onto boxes and cells inside a box the
+same way, so they are applied as fixed cell permutations (bitboard.sym_cells) to the planes and the move
+augment='all' writes every position 8 times, augment='random' once under a random symmetry
+
+    build_dataset('selfplay.uttt', 'data/', n_jobs=8)
+    for x, value, move in open_shards('data/'):   # memory mapped
+        ...
+'''
+import glob
+import os
+import multiprocessing
+
+import numpy as np
+
+import bitboard
+from board import board_obj
+from operations import ops
+from gamelog import game_log_index, UNFINISHED
+
+N_PLANES = 6
+PACKED_BYTES = (N_PLANES * 81 + 7) // 8
+
+sym_cells = np.array(bitboard.sym_cells, dtype=np.intp)
+# gather form: planes[..., sym_gather[k]] applies symmetry k
+sym_gather = np.argsort(sym_cells, axis=1)
+
+# 81-bit row-major mask of every cell in the boxes of a 9-bit macro mask
+_macro_spread = [0]*512
+for _mask in range(1, 512):
+    _low = _mask & -_mask
+    _macro_spread[_mask] = _macro_spread[_mask ^ _low] | bitboard.box_spread[_low.bit_length()-1][bitboard.full_box]
+del _mask, _low
+
+def encode_game(moves: bytes, result: int, buffer: bytearray, values: list, played: list) -> int:
+    '''
+    replays a game record and appends the planes of every position before a move to buffer
+    (6 little endian 81-bit masks of 11 bytes each), its value to values and its move to played
+    returns the number of positions added
+    '''
+    if result == UNFINISHED:
+        return 0
+    board = board_obj()
+    box_spread = bitboard.box_spread
+    for _cell in moves:
+        player = board.n_moves%2
+        own, opp = board.box_bits[player], board.box_bits[1-player]
+        own_cells = opp_cells = 0
+        for _box in range(9):
+            own_cells |= box_spread[_box][own[_box]]
+            opp_cells |= box_spread[_box][opp[_box]]
+        if board.active >= 0:
+            legal = box_spread[board.active][board.open_bits[board.active]]
+        else:
+            legal = board.legal_bits
+        for _plane in (own_cells, opp_cells,
+                       _macro_spread[board.macro_bits[player]],
+                       _macro_spread[board.macro_bits[1-player]],
+                       _macro_spread[board.macro_bits[2]],
+                       legal):
+            buffer += _plane.to_bytes(11, 'little')
+        values.append(0 if result == 2 else (1 if result == player else -1))
+        played.append(_cell)
+        ops.make_move(board, bitboard.cell_pos[_cell])
+    return len(moves)
+
+def decode_planes(buffer: bytes) -> np.array:
+    ''' (N,6,81) uint8 planes from the bytes written by encode_game '''
+    raw = np.frombuffer(buffer, dtype=np.uint8).reshape(-1, N_PLANES, 11)
+    return np.unpackbits(raw, axis=-1, count=81, bitorder='little')
+
+def augment_batch(x: np.array, move: np.array, value: np.array, augment: str, rng: np.random.Generator) -> tuple:
+    ''' applies the symmetries to (N,6,81) planes and (N,) moves '''
+    if augment is None:
+        return x, move, value
+    if augment == 'all':
+        xs = [x[:,:,sym_gather[_k]] for _k in range(8)]
+        moves = [sym_cells[_k][move] for _k in range(8)]
+        return np.concatenate(xs), np.concatenate(moves).astype(np.uint8), np.tile(value, 8)
+    if augment == 'random':
+        sym = rng.integers(8, size=len(x))
+        x = np.take_along_axis(x, sym_gather[sym][:,None,:], axis=2)
+        return x, sym_cells[sym, move].astype(np.uint8), value
+    raise ValueError(f'unknown augment {augment}, use None, all or random')
+
+def positions(records, batch_positions: int = 65536, augment: str = None, packed: bool = True, seed: int = 0):
+    '''
+    streams (x, value, move) batches from (moves, result, tag) records, e.g. gamelog.iter_games
+    x is (N,61) packed or (N,6,9,9), batches hold about batch_positions positions before augmentation
+    '''
+    rng = np.random.default_rng(seed)
+    buffer, values, played = bytearray(), [], []
+
+    def _flush():
+        x = decode_planes(bytes(buffer))
+        x, move, value = augment_batch(x, np.array(played, dtype=np.intp), np.array(values, dtype=np.int8), augment, rng)
+        if packed:
+            x = np.packbits(x.reshape(len(x), -1), axis=1)
+        else:
+            x = x.reshape(-1, N_PLANES, 9, 9)
+        buffer.clear()
+        values.clear()
+        played.clear()
+        return x, value, move.astype(np.uint8)
+
+    for moves, result, _ in records:
+        encode_game(moves, result, buffer, values, played)
+        if len(values) >= batch_positions:
+            yield _flush()
+    if values:
+        yield _flush()
+
+def unpack(x: np.array) -> np.array:
+    ''' (N,61) packed samples back to (N,6,9,9) planes '''
+    return np.unpackbits(x, axis=1, count=N_PLANES*81).reshape(-1, N_PLANES, 9, 9)
+
+''' ------------------ shards ---------------- '''
+
+class shard_writer:
+    '''
+    collects batches and writes them as numbered shards of shard_size positions:
+        {prefix}{n:05d}.x.npy  .value.npy  .move.npy
+    '''
+    def __init__(self, out_dir: str, prefix: str = 'shard_', shard_size: int = 1 << 20) -> None:
+        os.makedirs(out_dir, exist_ok=True)
+        self.out_dir = out_dir
+        self.prefix = prefix
+        self.shard_size = shard_size
+        self.n_shards = 0
+        self.n_positions = 0
+        self._pending = []
+        self._pending_size = 0
+
+    def write(self, x: np.array, value: np.array, move: np.array) -> None:
+        self._pending.append((x, value, move))
+        self._pending_size += len(x)
+        while self._pending_size >= self.shard_size:
+            self._write_shard(self.shard_size)
+
+    def _write_shard(self, size: int) -> None:
+        x, value, move = (np.concatenate(_cols) for _cols in zip(*self._pending))
+        path = os.path.join(self.out_dir, f'{self.prefix}{self.n_shards:05d}')
+        np.save(path + '.x.npy', x[:size])
+        np.save(path + '.value.npy', value[:size])
+        np.save(path + '.move.npy', move[:size])
+        self.n_shards += 1
+        self.n_positions += size
+        self._pending = [(x[size:], value[size:], move[size:])] if size < len(x) else []
+        self._pending_size = len(x) - size
+
+    def close(self) -> None:
+        if self._pending_size:
+            self._write_shard(self._pending_size)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def open_shards(out_dir: str, prefix: str = 'shard_'):
+    ''' yields memory mapped (x, value, move) of every shard in out_dir '''
+    for path in sorted(glob.glob(os.path.join(out_dir, f'{prefix}*.x.npy'))):
+        base = path[:-len('.x.npy')]
+        yield (np.load(path, mmap_mode='r'),
+               np.load(base + '.value.npy', mmap_mode='r'),
+               np.load(base + '.move.npy', mmap_mode='r'))
+
+def _build_chunk(args: tuple) -> int:
+    ''' worker: games [first, last) of a log into their own shards '''
+    log_path, out_dir, first, last, augment, packed, shard_size, seed = args
+    index = game_log_index(log_path, save_index=False)
+    records = (index[_idx] for _idx in range(first, last))
+    with shard_writer(out_dir, f'shard_{first:010d}_', shard_size) as writer:
+        for batch in positions(records, augment=augment, packed=packed, seed=(seed * 1000003 + first) & 0xffffffff):
+            writer.write(*batch)
+    index.close()
+    return writer.n_positions
+
+def build_dataset(log_path: str, out_dir: str, n_jobs: int = None, augment: str = None, packed: bool = True,
+                  shard_size: int = 1 << 20, games_per_task: int = 200000, seed: int = 0) -> int:
+    '''
+    turns every finished game of a log into training shards, n_jobs processes (default: all cores)
+    returns the number of positions written
+    '''
+    n_jobs = n_jobs or os.cpu_count() or 1
+    index = game_log_index(log_path) # builds and saves the offsets once, workers reuse them
+    n_games = len(index)
+    index.close()
+    tasks = [(log_path, out_dir, _first, min(_first + games_per_task, n_games), augment, packed, shard_size, seed)
+             for _first in range(0, n_games, games_per_task)]
+    if n_jobs == 1:
+        return sum(_build_chunk(_task) for _task in tasks)
+    with multiprocessing.get_context().Pool(n_jobs) as pool:
+        return sum(pool.imap_unordered(_build_chunk, tasks))
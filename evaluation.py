@@ -0,0 +1,160 @@
+'''
+heuristic evaluation with terms kept up to date by ops.make_move/undo_move
+
+terms (board terms are first player minus second player, the score flips to the player to move):
+    won_boxes       boxes won
+    won_position    boxes won, weighted by box position (box_weights)
+    macro_twos      open two-in-a-rows on the macro board (third box not finished)
+    box_twos        open two-in-a-rows inside unfinished boxes, weighted by box position
+    cells           markers in unfinished boxes, weighted by cell position (cell_weights)
+    free_move       the player to move may play anywhere (the opponent sent them to a finished box)
+    send_threat     the player to move was sent to a box they can win this move
+the last two are from the view of the player to move and read at evaluation time
+
+    ev = evaluator(weights={'macro_twos': 80})
+    ev.attach(board)          # board terms follow every make_move/undo_move from here
+    ev.evaluate(board)        # score for the player to move
+    ev.detach(board)
+
+feature_matrix(boards) gives the unweighted terms of many positions (score = features @ weights),
+to fit the weights in batch
+'''
+import numpy as np
+
+import bitboard
+from board import board_obj
+
+term_names = ('won_boxes', 'won_position', 'macro_twos', 'box_twos', 'cells', 'free_move', 'send_threat')
+
+default_weights = {'won_boxes': 100,
+                   'won_position': 10,
+                   'macro_twos': 60,
+                   'box_twos': 4,
+                   'cells': 1,
+                   'free_move': 15,
+                   'send_threat': 20}
+
+# centre 4, corners 2, edges 1, the same weighting as line_completer_bot.box_probs (bit order of a box)
+position_weights = (2, 1, 2, 1, 4, 1, 2, 1, 2)
+
+# two_lines[mask] -> 8-bit mask of the lines holding exactly two of mask's bits
+two_lines = [sum(1 << _l for _l, _line in enumerate(bitboard.lines) if (_m & _line).bit_count() == 2) for _m in range(512)]
+
+def open_twos(own: int, blockers: int) -> int:
+    ''' two-in-a-rows of own whose third cell is not in blockers '''
+    return (two_lines[own] & bitboard.open_lines_table[blockers]).bit_count()
+
+def threat_cells(own: int, opp: int) -> int:
+    ''' 9-bit mask of the empty cells that complete a line for own '''
+    return bitboard.completer_table[own] & ~(own | opp) & bitboard.full_box
+
+def _weight_table(weights: tuple) -> list:
+    # weight_table[mask] -> sum of the weights of mask's bits
+    return [sum(weights[_k] for _k in range(9) if _m >> _k & 1) for _m in range(512)]
+
+class evaluator:
+    '''
+    configurable evaluation, attach it to a board to have ops keep its board terms incremental
+    weights: dict of term -> weight (missing terms keep default_weights)
+    box_weights / cell_weights: 9 position weights in box bit order
+    NOTE: an evaluator follows one board at a time, attaching it to another board (or calling
+          features on one) starts over from that board
+    '''
+    def __init__(self,
+                 weights: dict = None,
+                 box_weights: tuple = position_weights,
+                 cell_weights: tuple = position_weights) -> None:
+        self.weights = dict(default_weights)
+        self.set_weights(weights or {})
+        self.box_weights = tuple(box_weights)
+        self.box_value = _weight_table(box_weights)
+        self.cell_value = _weight_table(cell_weights)
+
+        # board terms of the attached board: per box (box_twos, cells), and the running totals
+        self.box_terms = [(0, 0)]*9
+        self.terms = [0]*5
+        self._macro = None
+
+    def set_weights(self, weights: dict) -> None:
+        for name, value in weights.items():
+            if name not in default_weights:
+                raise KeyError(f'unknown evaluation term {name}, use one of {term_names}')
+            self.weights[name] = value
+        self.weight_vector = [self.weights[_name] for _name in term_names]
+
+    ''' ------------------ incremental board terms ---------------- '''
+
+    def attach(self, board: board_obj) -> None:
+        ''' computes the board terms of board, ops.make_move/undo_move update them from now on '''
+        board.evaluator = self
+        self.box_terms = [(0, 0)]*9
+        self.terms = [0]*5
+        self._macro = None
+        for _box in range(9):
+            self.update(board, _box)
+
+    def detach(self, board: board_obj) -> None:
+        if board.evaluator is self:
+            board.evaluator = None
+
+    def update(self, board: board_obj, box: int) -> None:
+        ''' called by ops after a move in box was made or undone '''
+        p1, p2, stale = board.macro_bits
+        if (p1 | p2 | stale) >> box & 1:
+            new = (0, 0) # a finished box only counts on the macro board
+        else:
+            own, opp = board.box_bits[0][box], board.box_bits[1][box]
+            new = ((open_twos(own, opp) - open_twos(opp, own)) * self.box_weights[box],
+                   self.cell_value[own] - self.cell_value[opp])
+        old = self.box_terms[box]
+        terms = self.terms
+        terms[3] += new[0] - old[0]
+        terms[4] += new[1] - old[1]
+        self.box_terms[box] = new
+
+        # the macro terms change only when a box is finished or reopened
+        macro = (p1, p2, stale)
+        if macro != self._macro:
+            self._macro = macro
+            terms[0] = p1.bit_count() - p2.bit_count()
+            terms[1] = self.box_value[p1] - self.box_value[p2]
+            terms[2] = open_twos(p1, p2 | stale) - open_twos(p2, p1 | stale)
+
+    ''' ------------------ evaluation ---------------- '''
+
+    def features(self, board: board_obj) -> list:
+        ''' the terms of board (attached or not) from the view of the player to move '''
+        if board.evaluator is not self:
+            attached = board.evaluator
+            self.attach(board)
+            board.evaluator = attached
+        player = board.n_moves%2
+        sign = -1 if player else 1
+        out = [sign * _term for _term in self.terms]
+        if board.active < 0:
+            out += [1, 0]
+        else:
+            _box = board.active
+            _threat = threat_cells(board.box_bits[player][_box], board.box_bits[1-player][_box])
+            out += [0, 1 if _threat else 0]
+        return out
+
+    def evaluate(self, board: board_obj) -> float:
+        ''' score of an attached board for the player to move '''
+        w = self.weight_vector
+        t = self.terms
+        score = w[0]*t[0] + w[1]*t[1] + w[2]*t[2] + w[3]*t[3] + w[4]*t[4]
+        player = board.n_moves%2
+        if player:
+            score = -score
+        if board.active < 0:
+            return score + w[5]
+        _box = board.active
+        if threat_cells(board.box_bits[player][_box], board.box_bits[1-player][_box]):
+            return score + w[6]
+        return score
+
+def feature_matrix(boards: list, ev: evaluator = None) -> np.array:
+    ''' (N, len(term_names)) terms of many positions, for fitting weights (score = features @ weights) '''
+    ev = ev or evaluator()
+    return np.array([ev.features(_board) for _board in boards], dtype=float)
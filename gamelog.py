@@ -0,0 +1,209 @@
+'''
+binary game logs for large self-play archives
+
+a log is an 8 byte header followed by one record per game, appended in order:
+    n_moves  uint8    number of move bytes that follow the record header
+    result   uint8    0 first player won, 1 second player won, 2 draw, 255 unfinished
+    tag      uint32   free for the caller (seed, bot pair, generation...), little endian
+    moves    n_moves bytes, the cell of each move (row*9 + col)
+so a game costs 6 bytes plus one byte per move (vis_tools.cvt_vis_app uses the same
+cell numbering, offset by 32)
+
+    with game_log_writer('selfplay.uttt') as log:
+        log.write(board, tag=seed)
+
+    for moves, result, tag in iter_games('selfplay.uttt'):   # streaming, constant memory
+        board = replay(moves)
+
+    index = game_log_index('selfplay.uttt')                   # memory mapped, random access
+    moves, result, tag = index[123456]
+
+records are replayed without validation, only write games that were checked when played
+the index keeps the record offsets in a sidecar .idx file (npy), so reopening a log skips the
+scan; games appended since then are scanned and added on open
+'''
+import mmap
+import os
+import struct
+
+import numpy as np
+
+import bitboard
+from board import board_obj
+from operations import ops
+
+MAGIC = b'UTTTLOG1'
+UNFINISHED = 255
+
+_record_header = struct.Struct('<BBI')
+_cell_pos = bitboard.cell_pos
+
+def board_result(board: board_obj) -> int:
+    ''' result code of a board, the last mover wins if the game ended with a line '''
+    if not (board.n_moves and ops.check_game_finished(board)):
+        return UNFINISHED
+    if bitboard.line_table[board.macro_bits[(board.n_moves-1)%2]]:
+        return (board.n_moves-1)%2
+    return 2
+
+def replay(moves: bytes, board: board_obj = None) -> board_obj:
+    ''' plays the cells in moves on board (a new board by default), no validity checks '''
+    if board is None:
+        board = board_obj()
+    for _cell in moves:
+        ops.make_move(board, _cell_pos[_cell])
+    return board
+
+def _check_header(header: bytes, path: str) -> None:
+    if header != MAGIC:
+        raise ValueError(f'{path} is not a game log (bad header {header!r})')
+
+class game_log_writer:
+    '''
+    appends games to a log, creating it if needed
+    use as a context manager or call close(), records are buffered until then
+    '''
+    def __init__(self, path: str, buffer_size: int = 1 << 20) -> None:
+        self.path = path
+        self.file = open(path, 'ab', buffering=buffer_size)
+        if self.file.tell() == 0:
+            self.file.write(MAGIC)
+        else:
+            with open(path, 'rb') as _f:
+                _check_header(_f.read(len(MAGIC)), path)
+        self.n_written = 0
+
+    def write(self, board: board_obj, result: int = None, tag: int = 0) -> None:
+        ''' logs the moves played on board, the result is read from the board unless given '''
+        if result is None:
+            result = board_result(board)
+        hist = board.hist[:board.n_moves]
+        moves = (hist[:,0].astype(np.uint8) * 9 + hist[:,1]).tobytes()
+        self.write_moves(moves, result, tag)
+
+    def write_moves(self, moves: bytes, result: int = UNFINISHED, tag: int = 0) -> None:
+        ''' logs a game given as cells (bytes or a sequence of ints) '''
+        moves = bytes(moves)
+        if len(moves) > 81:
+            raise ValueError(f'a game has at most 81 moves, got {len(moves)}')
+        self.file.write(_record_header.pack(len(moves), result, tag))
+        self.file.write(moves)
+        self.n_written += 1
+
+    def close(self) -> None:
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def iter_games(path: str, chunk_size: int = 1 << 20):
+    ''' streams (moves, result, tag) from a log, reading chunk_size bytes at a time '''
+    header_size = _record_header.size
+    with open(path, 'rb') as f:
+        _check_header(f.read(len(MAGIC)), path)
+        buffer = b''
+        pos = 0
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                break
+            buffer = buffer[pos:] + chunk
+            pos = 0
+            end = len(buffer)
+            while pos + header_size <= end:
+                n_moves, result, tag = _record_header.unpack_from(buffer, pos)
+                _next = pos + header_size + n_moves
+                if _next > end:
+                    break
+                yield buffer[pos + header_size:_next], result, tag
+                pos = _next
+        if pos != len(buffer):
+            raise ValueError(f'{path} ends with a truncated record')
+
+def iter_boards(path: str):
+    ''' streams (board, result, tag) from a log, every game replayed on a new board '''
+    for moves, result, tag in iter_games(path):
+        yield replay(moves), result, tag
+
+class game_log_index:
+    '''
+    random access to a log through a memory map
+    offsets holds the start of every record plus the end of the last one
+    '''
+    def __init__(self, path: str, save_index: bool = True) -> None:
+        self.path = path
+        self.index_path = path + '.idx'
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        _check_header(self._map[:len(MAGIC)], path)
+        self.data = np.frombuffer(self._map, dtype=np.uint8)
+
+        offsets = None
+        if os.path.exists(self.index_path):
+            offsets = np.load(self.index_path, mmap_mode='r')
+            if len(offsets) == 0 or offsets[-1] > len(self._map):
+                offsets = None # the log was rewritten, the index is stale
+        if offsets is None:
+            offsets = np.array([len(MAGIC)], dtype=np.uint64)
+        if offsets[-1] < len(self._map):
+            offsets = np.concatenate([offsets, self._scan(int(offsets[-1]))])
+            if save_index:
+                np.save(self.index_path, offsets)
+        self.offsets = offsets
+
+    def _scan(self, pos: int) -> np.array:
+        ''' offsets of the ends of the records from pos to the end of the log '''
+        data = self._map
+        end = len(data)
+        header_size = _record_header.size
+        ends = []
+        while pos < end:
+            pos += header_size + data[pos]
+            ends.append(pos)
+        if pos != end:
+            raise ValueError(f'{self.path} ends with a truncated record')
+        return np.array(ends, dtype=np.uint64)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> tuple:
+        ''' (moves, result, tag) of game idx '''
+        if idx < 0:
+            idx += len(self)
+        if not 0 <= idx < len(self):
+            raise IndexError(f'game {idx} out of range')
+        start = int(self.offsets[idx])
+        n_moves, result, tag = _record_header.unpack_from(self._map, start)
+        start += _record_header.size
+        return self._map[start:start + n_moves], result, tag
+
+    def board(self, idx: int) -> board_obj:
+        return replay(self[idx][0])
+
+    ''' ------------------ whole-log columns (no replay) ---------------- '''
+
+    def n_moves(self) -> np.array:
+        return self.data[self.offsets[:-1].astype(np.int64)]
+
+    def results(self) -> np.array:
+        return self.data[self.offsets[:-1].astype(np.int64) + 1]
+
+    def tags(self) -> np.array:
+        _starts = self.offsets[:-1].astype(np.int64)[:,None] + 2 + np.arange(4)
+        return self.data[_starts].copy().view('<u4').ravel()
+
+    def close(self) -> None:
+        self.data = None
+        self.offsets = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
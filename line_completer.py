@@ -1,4 +1,14 @@
+from bisect import bisect_right
+
 import numpy as np
+from bitboard import full_box, line_table, completer_table, mask_cells, to_mask, box_cells
+from board import board_obj
+from operations import board_view
+
+# flat cells of every box in bit order, and the bit values, to read box masks off a 9x9 array
+_box_cells = np.array(box_cells)
+_bit_weights = 1 << np.arange(9)
+
 class line_completer_bot:
     '''
     tries to complete lines, otherwise it plays randomly
@@ -28,14 +38,8 @@ class line_completer_bot:
         '''
         box is a (3,3) array
         returns True if a line is found, else returns False '''
-        for i in range(3):
-            if abs(sum(box[:,i])) == 3: return True # horizontal
-            if abs(sum(box[i,:])) == 3: return True # vertical
-
-        # diagonals
-        if abs(box.trace()) == 3: return True
-        if abs(np.rot90(box).trace()) == 3: return True
-        return False
+        # a line is three of the same marker, look both masks up in the line table
+        return line_table[to_mask(box == 1)] or line_table[to_mask(box == -1)]
 
     def _check_line_playerwise(self, box: np.array, player: int = None):
         ''' returns true if the given player has a line in the box, else false
@@ -87,17 +91,15 @@ class line_completer_bot:
             print('invalid mini_board') # should never reach here
         # works as expected, however mini-board sometimes is sometimes invalid
         ''' completes a line if available '''
-        # loop through valid moves with hypothetic self position there.
+        # the completer table holds the empty cells that would make a line for the +1 player
         # if it makes a line it's an imminent win
-        imminent = list()
-        valid_moves = self.get_valid(mini_board)
-        for _valid in zip(*valid_moves):
-            # create temp valid pattern
-            valid_filter = np.zeros((3,3))
-            valid_filter[_valid[0],_valid[1]] = 1
-            if self._check_line(mini_board + valid_filter):
-                imminent.append(_valid)
-        return imminent
+        own = to_mask(mini_board == 1)
+        opp = to_mask(mini_board == -1)
+        empty = full_box & ~(own | opp)
+        if line_table[own] or line_table[opp]:
+            # a line is already there, any valid move "makes" it
+            return list(mask_cells[empty])
+        return list(mask_cells[completer_table[own] & empty])
     
     def get_probs(self, valid_moves: list) -> np.array:
         ''' match the probability with the valid moves to weight the random choice '''
@@ -209,3 +211,107 @@ class line_completer_bot:
         valid_moves = np.array(list(zip(*self.get_valid(mini_board))))
         return tuple(valid_moves[np.random.choice(len(valid_moves), p=self.get_probs(valid_moves))])
 
+
+
+class fast_line_completer_bot(line_completer_bot):
+    '''
+    line_completer_bot on 9-bit box masks and lookup tables
+    it plays the same moves and draws the same numbers from np.random as line_completer_bot,
+    so both bots play identical games from the same seed
+    policy_move takes a board_obj directly, for use as a rollout policy inside a search
+    NOTE: the weighted choices are tabulated from box_probs in __init__, change box_probs before that
+    '''
+    def __init__(self, name: str = 'Chekhov') -> None:
+        super().__init__(name)
+        # cdf of the weighted choice over the cells of each 9-bit mask, built the way np.random.choice builds it
+        self.cdf = [None]*512
+        for _mask in range(1, 512):
+            _cdf = np.asarray(self.get_probs(list(mask_cells[_mask])), dtype=float).cumsum()
+            _cdf /= _cdf[-1]
+            self.cdf[_mask] = _cdf.tolist()
+
+    def move(self, board_dict: dict) -> tuple:
+        if isinstance(board_dict, board_view):
+            return self.policy_move(board_dict.board)
+        # box masks of both players from the 9x9 state (+1 is the player to move)
+        _cells = board_dict['board_state'].ravel()[_box_cells]
+        own = ((_cells == 1) @ _bit_weights).tolist()
+        opp = ((_cells == -1) @ _bit_weights).tolist()
+        active_box = board_dict['active_box']
+        if active_box[0] == -1:
+            box = self._major(*self._finished(own, opp))
+        else:
+            box = active_box[0]*3 + active_box[1]
+        return self._play(own[box], opp[box], box)
+
+    def policy_move(self, board: board_obj) -> tuple:
+        ''' the bot's move on board, without building the board dictionary '''
+        player = board.n_moves%2
+        if board.n_moves == 0:
+            box = 0 # the board dictionary reports box (0,0) before the first move
+        elif board.active < 0:
+            box = self._major(board.macro_bits[player], board.macro_bits[1-player], board.macro_bits[2])
+        else:
+            box = board.active
+        return self._play(board.box_bits[player][box], board.box_bits[1-player][box], box)
+
+    ''' ------------------ bot specific logic ---------------- '''
+
+    @staticmethod
+    def _finished(own: list, opp: list) -> tuple:
+        ''' get_finished as (self, opponent, stale) 9-bit masks '''
+        self_boxes = opp_boxes = stale_boxes = 0
+        for _box in range(9):
+            _finished = False
+            if line_table[own[_box]]:
+                self_boxes |= 1 << _box
+                _finished = True
+            if line_table[opp[_box]]:
+                opp_boxes |= 1 << _box
+                _finished = True
+            if not _finished and own[_box] | opp[_box] == full_box:
+                stale_boxes |= 1 << _box
+        return self_boxes, opp_boxes, stale_boxes
+
+    def _major(self, self_boxes: int, opp_boxes: int, stale_boxes: int) -> int:
+        ''' major_heuristic, returns the box to play in '''
+        # imminent wins, then blocks (neither pointing to a finished box), else any open box
+        for _mine, _other in ((self_boxes, opp_boxes), (opp_boxes, self_boxes)):
+            _targets = self._completers(_mine) & ~stale_boxes & ~_other
+            if _targets:
+                _r, _c = self._weighted(_targets)
+                return _r*3 + _c
+        _r, _c = self._weighted(full_box & ~(self_boxes | opp_boxes | stale_boxes))
+        return _r*3 + _c
+
+    def _play(self, own: int, opp: int, box: int) -> tuple:
+        ''' mid_heuristic on one box (complete a line, else block, else a weighted random cell), as a board move '''
+        empty = full_box & ~(own | opp)
+        if line_table[own] or line_table[opp]:
+            _r, _c = self._uniform(empty) # complete_line offers every empty cell once a line is there
+        elif completer_table[own] & empty:
+            _r, _c = self._uniform(completer_table[own] & empty)
+        elif completer_table[opp] & empty:
+            _r, _c = self._uniform(completer_table[opp] & empty)
+        else:
+            _r, _c = self._weighted(empty)
+        return (_r + 3*(box//3), _c + 3*(box%3))
+
+    @staticmethod
+    def _completers(mine: int) -> int:
+        ''' complete_line of a 0/1 box as a mask '''
+        if line_table[mine]:
+            return full_box & ~mine
+        return completer_table[mine] & ~mine
+
+    @staticmethod
+    def _uniform(mask: int) -> tuple:
+        # np.random.choice(n) without weights draws np.random.randint(n), which uses no numbers for n == 1
+        _cells = mask_cells[mask]
+        if len(_cells) == 1:
+            return _cells[0]
+        return _cells[np.random.randint(len(_cells))]
+
+    def _weighted(self, mask: int) -> tuple:
+        # np.random.choice(n, p) draws one random_sample and searches the cdf
+        return mask_cells[mask][bisect_right(self.cdf[mask], np.random.random_sample())]
@@ -0,0 +1,297 @@
+'''
+monte carlo tree search (UCT) bot
+
+the tree lives in a node pool of flat arrays (one entry per node, the children of a
+node are allocated as one contiguous block), not in python node objects
+playouts make and undo moves on a single board_obj and pick random moves straight from
+the bitboards, so the playout loop doesn't build move lists
+the subtree under the actual game continuation is kept between moves of the same game
+
+    bot = mcts_bot(thinking_time=0.4)
+    move = bot.move(ops.pull_view(board))
+    bot.playouts_per_sec
+'''
+import math
+import random
+from array import array
+from time import perf_counter
+
+import bitboard
+from board import board_obj
+from operations import ops
+from book import known_move, endgame_share
+
+class mcts_bot:
+    '''
+    UCT search with the standard move(board_dict) interface
+    the budget is thinking_time seconds, or max_playouts playouts if that is set
+    '''
+    def __init__(self,
+                 name: str = 'MCTS',
+                 thinking_time: float = 0.1,
+                 max_playouts: int = None,
+                 exploration: float = 1.4,
+                 capacity: int = 200000,
+                 reuse_tree: bool = True,
+                 book=None,
+                 endgame=None) -> None:
+        self.name = name
+        self.thinking_time = thinking_time
+        self.max_playouts = max_playouts
+        self.exploration = exploration
+        self.capacity = capacity
+        self.reuse_tree = reuse_tree
+        self.book = book       # book.opening_book, answers known openings
+        self.endgame = endgame # book.endgame_solver, takes over near the end
+
+        # node pool
+        self.move_cell = array('b', bytes(capacity))      # cell of the move leading to the node
+        self.first_child = array('i', [-1]) * capacity    # index of the first child, -1 until expanded
+        self.n_children = array('B', bytes(capacity))
+        self.visits = array('i', [0]) * capacity
+        self.wins = array('d', [0.0]) * capacity          # from the view of the player who moved into the node
+        self.n_nodes = 0
+        self.root = 0
+        self.root_hist = b''                              # history of the root position, to match the next call
+
+        self.path = [0]*82 # nodes from the root down during one iteration
+
+        # stats of the last move
+        self.playouts = 0
+        self.elapsed = 0.0
+        self.playouts_per_sec = 0.0
+        self.reused_visits = 0
+
+    ''' ------------------ required function ---------------- '''
+
+    def move(self, board_dict: dict) -> tuple:
+        # searches on the game's own board when given a view, every move made is undone
+        return self.get_best_move(ops.board_from_dict(board_dict))
+
+    ''' ------------------ search ---------------- '''
+
+    def get_best_move(self, board: board_obj) -> tuple:
+        start = perf_counter()
+        move = known_move(board, self.book, self.endgame, self.thinking_time * endgame_share)
+        if move is not None:
+            self.playouts = 0
+            self.elapsed = perf_counter() - start
+            return move
+        self._set_root(board)
+        self.reused_visits = self.visits[self.root]
+
+        deadline = start + self.thinking_time
+        self.playouts = 0
+        while True:
+            self._iterate(board)
+            self.playouts += 1
+            if self.max_playouts is not None:
+                if self.playouts >= self.max_playouts:
+                    break
+            elif perf_counter() > deadline:
+                break
+
+        self.elapsed = perf_counter() - start
+        self.playouts_per_sec = self.playouts / max(self.elapsed, 1e-9)
+
+        # the most visited child is the move
+        best_child = self._most_visited(self.root)
+        return bitboard.cell_pos[self.move_cell[best_child]]
+
+    def _iterate(self, board: board_obj) -> None:
+        ''' one selection / expansion / playout / backpropagation pass '''
+        node = self.root
+        path = self.path
+        path[0] = node
+        depth = 0
+
+        # selection
+        while self.n_children[node]:
+            node = self._select(node)
+            ops.make_move(board, bitboard.cell_pos[self.move_cell[node]])
+            depth += 1
+            path[depth] = node
+
+        # expansion (a leaf is expanded the second time it's reached, the root always)
+        finished = board.n_moves > 0 and ops.check_game_finished(board)
+        if not finished and (self.visits[node] or node == self.root) and self._expand(node, board):
+            node = self.first_child[node] + int(random.random() * self.n_children[node])
+            ops.make_move(board, bitboard.cell_pos[self.move_cell[node]])
+            depth += 1
+            path[depth] = node
+
+        # playout, result is the winning channel (2 for a draw)
+        result = self._playout(board)
+
+        # backpropagation, each node scores the result for the player who moved into it
+        mover = (board.n_moves - 1)%2
+        visits = self.visits
+        wins = self.wins
+        for _d in range(depth, -1, -1):
+            _node = path[_d]
+            visits[_node] += 1
+            if result == mover:
+                wins[_node] += 1.0
+            elif result == 2:
+                wins[_node] += 0.5
+            mover ^= 1
+
+        for _ in range(depth):
+            ops.undo_move(board)
+
+    def _select(self, node: int) -> int:
+        ''' UCT child selection, unvisited children first '''
+        first = self.first_child[node]
+        visits = self.visits
+        wins = self.wins
+        log_parent = self.exploration * self.exploration * math.log(visits[node] or 1)
+        best = first
+        best_score = -1.0
+        for child in range(first, first + self.n_children[node]):
+            n = visits[child]
+            if n == 0:
+                return child
+            score = wins[child] / n + math.sqrt(log_parent / n)
+            if score > best_score:
+                best_score = score
+                best = child
+        return best
+
+    def _expand(self, node: int, board: board_obj) -> bool:
+        ''' gives node one child per legal move, False when the pool is full '''
+        moves = ops.get_valid_moves(board)
+        if self.n_nodes + len(moves) > self.capacity:
+            return False
+        first = self.n_nodes
+        for _idx, _move in enumerate(moves):
+            _child = first + _idx
+            self.move_cell[_child] = _move[0]*9 + _move[1]
+            self.first_child[_child] = -1
+            self.n_children[_child] = 0
+            self.visits[_child] = 0
+            self.wins[_child] = 0.0
+        self.first_child[node] = first
+        self.n_children[node] = len(moves)
+        self.n_nodes += len(moves)
+        return True
+
+    @staticmethod
+    def _playout(board: board_obj) -> int:
+        ''' random moves until the game ends, returns the winning channel (2 for a draw), board is restored '''
+        n_made = 0
+        cell_pos = bitboard.cell_pos
+        box_moves = bitboard.box_moves
+        row_moves = bitboard.row_moves
+        while not (board.n_moves and ops.check_game_finished(board)):
+            if board.active >= 0:
+                _moves = box_moves[board.active][board.open_bits[board.active]]
+                _move = _moves[int(random.random() * len(_moves))]
+            else:
+                # pick the k-th open cell, one row of the 81-bit mask at a time
+                _legal = board.legal_bits
+                _k = int(random.random() * _legal.bit_count())
+                _row = 0
+                while True:
+                    _seg = _legal & 0b111111111
+                    _count = _seg.bit_count()
+                    if _k < _count:
+                        _move = row_moves[_row][_seg][_k]
+                        break
+                    _k -= _count
+                    _legal >>= 9
+                    _row += 1
+            ops.make_move(board, _move)
+            n_made += 1
+
+        if bitboard.line_table[board.macro_bits[(board.n_moves-1)%2]]:
+            result = (board.n_moves-1)%2
+        else:
+            result = 2
+        for _ in range(n_made):
+            ops.undo_move(board)
+        return result
+
+    ''' ------------------ tree reuse ---------------- '''
+
+    def _set_root(self, board: board_obj) -> None:
+        ''' moves the root down to board's position if it continues the previous search, else starts a new tree '''
+        hist = board.hist[:board.n_moves].tobytes()
+        root_n = len(self.root_hist) // 2
+        node = self.root
+        if self.reuse_tree and self.n_nodes and board.n_moves >= root_n and hist[:len(self.root_hist)] == self.root_hist:
+            # follow the moves played since the last search
+            for _idx in range(root_n, board.n_moves):
+                _cell = int(board.hist[_idx][0])*9 + int(board.hist[_idx][1])
+                node = self._find_child(node, _cell)
+                if node < 0:
+                    break
+        else:
+            node = -1
+
+        if node < 0:
+            self.n_nodes = 1
+            self.root = 0
+            self.first_child[0] = -1
+            self.n_children[0] = 0
+            self.visits[0] = 0
+            self.wins[0] = 0.0
+        else:
+            self._compact(node)
+        self.root_hist = hist
+
+    def _find_child(self, node: int, cell: int) -> int:
+        first = self.first_child[node]
+        if first < 0:
+            return -1
+        for child in range(first, first + self.n_children[node]):
+            if self.move_cell[child] == cell:
+                return child
+        return -1
+
+    def _compact(self, new_root: int) -> None:
+        ''' copies the subtree under new_root to the front of the pool (breadth first, child blocks stay contiguous) '''
+        old = (self.move_cell, self.first_child, self.n_children, self.visits, self.wins)
+        move_cell, first_child, n_children, visits, wins = (array(_a.typecode, _a) for _a in old)
+
+        self.move_cell[0] = move_cell[new_root]
+        self.visits[0] = visits[new_root]
+        self.wins[0] = wins[new_root]
+        # queue of (old index, new index), children get new indices in blocks as their parent is visited
+        queue = [(new_root, 0)]
+        n_nodes = 1
+        head = 0
+        while head < len(queue):
+            _old, _new = queue[head]
+            head += 1
+            _first = first_child[_old]
+            _count = n_children[_old]
+            if _first < 0:
+                self.first_child[_new] = -1
+                self.n_children[_new] = 0
+                continue
+            self.first_child[_new] = n_nodes
+            self.n_children[_new] = _count
+            for _k in range(_count):
+                _child = n_nodes + _k
+                self.move_cell[_child] = move_cell[_first + _k]
+                self.visits[_child] = visits[_first + _k]
+                self.wins[_child] = wins[_first + _k]
+                queue.append((_first + _k, _child))
+            n_nodes += _count
+        self.n_nodes = n_nodes
+        self.root = 0
+
+    ''' ------------------ helpers ---------------- '''
+
+    def _most_visited(self, node: int) -> int:
+        first = self.first_child[node]
+        return max(range(first, first + self.n_children[node]), key=self.visits.__getitem__)
+
+    def stats(self) -> dict:
+        ''' numbers from the last move, to track engine speed '''
+        return {'playouts': self.playouts,
+                'seconds': self.elapsed,
+                'playouts_per_sec': self.playouts_per_sec,
+                'tree_nodes': self.n_nodes,
+                'reused_visits': self.reused_visits,
+                'root_visits': self.visits[self.root]}
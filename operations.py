@@ -1,5 +1,24 @@
+from collections.abc import Mapping
+
 import numpy as np
 from board import board_obj
+import bitboard
+import zobrist
+
+# _state_values[player to move][p1 + 256*p2] -> value of a cell in ops._board_state
+_state_values = (np.zeros(257), np.zeros(257))
+_state_values[0][1] = _state_values[1][256] = 1
+_state_values[0][256] = _state_values[1][1] = -1
+
+_integer_types = (int, np.integer) # move coordinates check_move_is_valid accepts
+
+def _marker_pairs(markers: np.array) -> np.array:
+    ''' (9,9) uint16 view of markers, both channels of a cell in one number (p1 + 256*p2)
+    None for markers that aren't a contiguous bool array '''
+    try:
+        return markers.view('<u2').reshape(9,9)
+    except ValueError:
+        return None
 
 class ops():
     lines_mask = np.array([[1,1,1,0,0,0,0,0,0], # horizontals
@@ -16,88 +35,145 @@ class ops():
         return board_obj.n_moves%2 
     
     @staticmethod
-    def make_move(board_obj: board_obj, move:tuple) -> None:
+    def make_move(board_obj: board_obj, move:tuple) -> int:
+        ''' plays the move for the player to move, returns its undo record (also pushed on board_obj.undo_stack) '''
         # NOTE: there is no safety check in here, we deal with error handling elsewhere.
-        
+        _cell = int(move[0])*9 + int(move[1])
+
         # update move history
         board_obj.hist[board_obj.n_moves] = move
         
         # update board for player
         board_obj.markers[move[0],move[1], board_obj.n_moves%2] = True
 
+        # update bitboards (and finished boxes)
+        _record = ops._place(board_obj, _cell, board_obj.n_moves%2)
+        board_obj.undo_stack[board_obj.n_moves] = _record
+        if board_obj.evaluator is not None:
+            board_obj.evaluator.update(board_obj, bitboard.cell_box[_cell])
+            
+        # update history index
+        board_obj.n_moves += 1
+        return _record
+
+    @staticmethod
+    def _place(board_obj: board_obj, cell: int, player: int) -> int:
+        ''' bitboard half of make_move, mirrors a newly finished box into board_obj.miniboxes
+        returns the undo record: cell | (previous active box + 1) << 7 | (finished channel + 1) << 11 '''
+        _box = bitboard.cell_box[cell]
+        _mine = board_obj.box_bits[player][_box] | bitboard.cell_bit[cell]
+        board_obj.box_bits[player][_box] = _mine
+        board_obj.open_bits[_box] ^= bitboard.cell_bit[cell]
+        board_obj.legal_bits ^= 1 << cell
+        _record = cell | (board_obj.active + 1) << 7
+        _key = board_obj.key ^ zobrist.cell_keys[player][cell] ^ zobrist.side_key ^ zobrist.active_keys[board_obj.active + 1]
+
         # if check line, update finished
-        if ops.check_minibox_lines(board_obj, move):
-            board_obj.miniboxes[move[0]//3, move[1]//3, board_obj.n_moves%2] = True
-            board_obj.n_moves += 1
-            return
+        if bitboard.line_table[_mine]:
+            board_obj.macro_bits[player] |= 1 << _box
+            board_obj.miniboxes[_box//3, _box%3, player] = True
+            board_obj.legal_bits &= ~bitboard.box_spread[_box][bitboard.full_box]
+            _record |= (player + 1) << 11
+            _key ^= zobrist.finished_keys[player][_box]
 
         # check stale
-        mini_board_idx = move[0]//3, move[1]//3
+        elif not board_obj.open_bits[_box]:
+            board_obj.macro_bits[2] |= 1 << _box
+            board_obj.miniboxes[_box//3, _box%3, 2] = True
+            _record |= 3 << 11
+            _key ^= zobrist.finished_keys[2][_box]
+
+        # where the opponent is sent
+        _target = bitboard.cell_target[cell]
+        if (board_obj.macro_bits[0] | board_obj.macro_bits[1] | board_obj.macro_bits[2]) >> _target & 1:
+            board_obj.active = -1
+        else:
+            board_obj.active = _target
+        board_obj.key = _key ^ zobrist.active_keys[board_obj.active + 1]
+        return _record
 
-        if np.all(np.any(board_obj.markers[mini_board_idx[0]*3:(mini_board_idx[0]+1)*3,
-                                           mini_board_idx[1]*3:(mini_board_idx[1]+1)*3],axis=2)):
-            board_obj.miniboxes[mini_board_idx[0],mini_board_idx[1],2] = True
-            
-        # update history index
-        board_obj.n_moves += 1
-    
     @staticmethod
-    def undo_move(board_obj: board_obj) -> None:
+    def undo_move(board_obj: board_obj) -> int:
+        ''' takes back the last move using its undo record, returns the record '''
         if board_obj.n_moves == 0:
-            print('no moves, returning null')
-            return
-        # update history and index
-        _move = np.copy(board_obj.hist[board_obj.n_moves-1])
-
-        board_obj.hist[board_obj.n_moves-1] = [0,0]
-        
-        # clear player markers (don't need to check for players)
-        board_obj.markers[_move[0],_move[1],:] = False
-        
-        # open that miniboard (the move was either the last move on that board or it was already open)
-        board_obj.miniboxes[_move[0]//3,_move[1]//3,:] = False
-        
+            raise IndexError('undo_move called with no moves played')
         # update index
         board_obj.n_moves -= 1
-        
+        _record = board_obj.undo_stack[board_obj.n_moves]
+        _cell = _record & 127
+        _box = bitboard.cell_box[_cell]
+        _bit = bitboard.cell_bit[_cell]
+        _player = board_obj.n_moves%2
+
+        # clear history and player marker
+        board_obj.hist[board_obj.n_moves] = 0
+        board_obj.markers[_cell//9, _cell%9, _player] = False
+        board_obj.box_bits[_player][_box] ^= _bit
+        board_obj.open_bits[_box] ^= _bit
+        _key = board_obj.key ^ zobrist.cell_keys[_player][_cell] ^ zobrist.side_key ^ zobrist.active_keys[board_obj.active + 1]
+
+        # reopen the miniboard only if this move finished it
+        _finished = _record >> 11
+        if _finished:
+            board_obj.macro_bits[_finished-1] ^= 1 << _box
+            board_obj.miniboxes[_box//3, _box%3, _finished-1] = False
+            board_obj.legal_bits |= bitboard.box_spread[_box][board_obj.open_bits[_box]]
+            _key ^= zobrist.finished_keys[_finished-1][_box]
+        else:
+            board_obj.legal_bits |= 1 << _cell
+
+        board_obj.active = (_record >> 7 & 15) - 1
+        board_obj.key = _key ^ zobrist.active_keys[board_obj.active + 1]
+        if board_obj.evaluator is not None:
+            board_obj.evaluator.update(board_obj, _box)
+        return _record
+
+    @staticmethod
+    def sync_bits(board_obj: board_obj) -> None:
+        ''' rebuilds the bitboards and undo stack by replaying the history (for boards built from arrays) '''
+        board_obj.box_bits = [[0]*9, [0]*9]
+        board_obj.macro_bits = [0, 0, 0]
+        board_obj.open_bits = [bitboard.full_box]*9
+        board_obj.legal_bits = (1 << 81) - 1
+        board_obj.active = -1
+        board_obj.undo_stack = [0]*81
+        board_obj.key = zobrist.start_key
+        for _idx in range(board_obj.n_moves):
+            _move = board_obj.hist[_idx]
+            board_obj.undo_stack[_idx] = ops._place(board_obj, int(_move[0])*9 + int(_move[1]), _idx%2)
 
     @staticmethod
     def get_valid_moves(board_obj:board_obj) -> list[tuple[int]]:
-        
-        # all non-markered positions
-        all_valid = (np.any(board_obj.markers,axis=2) == False)
-        
-        # initialization problem
-        if board_obj.n_moves == 0:
-            return list(zip(*np.where(all_valid)))
+        # mask to miniboard
+        if board_obj.active >= 0:
+            return list(bitboard.box_moves[board_obj.active][board_obj.open_bits[board_obj.active]])
 
-        # calculate last move's relative position
-        _last_move = board_obj.hist[board_obj.n_moves-1]
-        _rel_pos = _last_move[0] % 3, _last_move[1] % 3 # which minibox position is this
-        
         # ---- 'play anywhere' branch -----
-        # if minibox is finished
-        if np.any(board_obj.miniboxes[_rel_pos[0],_rel_pos[1]]):
-            # create "finished_box mask"
-            finished_mask = np.zeros((9,9),dtype=bool)
-            # loop through each finished box
-            temp_in = np.any(board_obj.miniboxes,axis=2)
-            for _box_finished_x, _box_finished_y, _flag in zip(np.arange(9)//3,np.arange(9)%3,temp_in.flatten()):
-                if ~_flag:
-                    finished_mask[_box_finished_x*3:(_box_finished_x+1)*3,
-                                  _box_finished_y*3:(_box_finished_y+1)*3] = True
-            return list(zip(*np.where(all_valid & finished_mask)))
-        
-        # mask to miniboard
-        mini_mask = np.zeros((9,9),dtype=bool)
-        mini_mask[_rel_pos[0]*3:(_rel_pos[0]+1)*3,
-                  _rel_pos[1]*3:(_rel_pos[1]+1)*3] = True
-        
-        return list(zip(*np.where(all_valid & mini_mask)))
+        # read the open cells of unfinished boxes one row at a time (row-major, like np.where over the 9x9)
+        _legal = board_obj.legal_bits
+        _moves = []
+        for _row in range(9):
+            if _legal & 0b111111111:
+                _moves += bitboard.row_moves[_row][_legal & 0b111111111]
+            _legal >>= 9
+        return _moves
 
     @staticmethod
     def check_move_is_valid(board_obj: board_obj, move: tuple) -> bool:
-        return move in ops.get_valid_moves(board_obj)
+        try:
+            _r, _c = move
+        except (TypeError, ValueError):
+            return False
+        # whole numbers only, int() would truncate 3.7 or parse '3' (bools are ints but not moves)
+        if not (isinstance(_r, _integer_types) and isinstance(_c, _integer_types)) or isinstance(_r, bool) or isinstance(_c, bool):
+            return False
+        _r, _c = int(_r), int(_c)
+        if not (0 <= _r < 9 and 0 <= _c < 9):
+            return False
+        _cell = _r*9 + _c
+        if board_obj.active >= 0:
+            return bitboard.cell_box[_cell] == board_obj.active and bool(board_obj.open_bits[board_obj.active] & bitboard.cell_bit[_cell])
+        return bool(board_obj.legal_bits >> _cell & 1)
     
     @staticmethod
     def check_minibox_lines(board_obj: board_obj, move: int) -> bool:
@@ -105,22 +181,12 @@ class ops():
         # get player channel by move number
         _player_channel = board_obj.n_moves%2
         
-        # select the minibox and relative position
-        _temp_minibox_idx = move[0]//3, move[1]//3
-        _rel_pos = move[0]%9, move[1]%9
-        
-        # the nested index below reduces the number of things to loop over
-        _temp_mini = board_obj.markers[_temp_minibox_idx[0]*3:(_temp_minibox_idx[0]+1)*3,
-                                       _temp_minibox_idx[1]*3:(_temp_minibox_idx[1]+1)*3,
-                                       _player_channel]
+        # select the minibox
+        _box = (move[0]//3)*3 + move[1]//3
 
         # check lines in that miniboard
-        for _line in ops.lines_mask:
-            if np.all(_temp_mini & _line == _line):
-                return True
-                
-        return False
-    
+        return bitboard.line_table[board_obj.box_bits[_player_channel][_box]]
+
     @staticmethod
     def check_game_finished(board_obj: board_obj) -> bool:
         ''' not a check whether it IS finished, but if the most recent move finished it '''
@@ -128,36 +194,25 @@ class ops():
         _player_channel = (board_obj.n_moves-1)%2
         
         # check if last active player made a line in the miniboxes
-        for _line in ops.lines_mask:
-            if np.all(board_obj.miniboxes[:,:,_player_channel] * _line == _line):
-                # game is finished
-                return True
+        if bitboard.line_table[board_obj.macro_bits[_player_channel]]:
+            # game is finished
+            return True
         
         # all miniboxes filled
         # (if all of them are filled will return true, otherwise will return false
-        return np.all(np.any(board_obj.miniboxes,axis=2))
+        return (board_obj.macro_bits[0] | board_obj.macro_bits[1] | board_obj.macro_bits[2]) == bitboard.full_box
     
     @staticmethod
     def pull_dictionary(board_obj: board_obj) -> dict:
         # dictionary, active miniboard, valid moves in the original format
+        # (ops.pull_view gives the same keys, computed lazily)
         temp_dict = {}
 
         # make array (the main thing)
-        temp_array = np.zeros((9,9))
-        temp_array[board_obj.markers[:,:,0]] = 1
-        temp_array[board_obj.markers[:,:,1]] = -1
-        temp_dict['board_state'] = temp_array
-        if board_obj.n_moves%2 == 1:
-            temp_dict['board_state'] *= -1 # flip perspectives based on player
+        temp_dict['board_state'] = ops._board_state(board_obj)
         
         # calculate active miniboard
-        _last_move = board_obj.hist[board_obj.n_moves-1]
-        _rel_pos = _last_move[0] % 3, _last_move[1] % 3
-
-        if np.any(board_obj.miniboxes[_rel_pos[0],_rel_pos[1]]):
-            temp_dict['active_box'] = (-1,-1)
-        else:
-            temp_dict['active_box'] = (_rel_pos[0],_rel_pos[1])
+        temp_dict['active_box'] = ops._active_box(board_obj)
 
         # valid moves (converted to tuples)
         temp_dict['valid_moves'] = ops.get_valid_moves(board_obj)
@@ -166,21 +221,129 @@ class ops():
         temp_dict['markers'] = board_obj.markers
         temp_dict['miniboxes'] = board_obj.miniboxes
         return temp_dict
+
+    @staticmethod
+    def pull_view(board_obj: board_obj) -> 'board_view':
+        ''' read-only, lazily computed stand-in for pull_dictionary (see board_view)
+        the view is live, so every board keeps one (board_obj.view) and hands it out again '''
+        _view = board_obj.view
+        if _view is None:
+            _view = board_obj.view = board_view(board_obj)
+        return _view
+
+    @staticmethod
+    def board_from_dict(board_dict) -> board_obj:
+        ''' the live board behind a board_view (no copy), otherwise a board_obj built from the dictionary
+        NOTE: a bot searching on the live board must undo every move it makes '''
+        if isinstance(board_dict, board_view):
+            return board_dict.board
+        b_obj = board_obj()
+        b_obj.build_from_dict_gamestate(board_dict)
+        return b_obj
+
+    @staticmethod
+    def _board_state(board_obj: board_obj) -> np.array:
+        ''' 9x9 floats, +1 for the player to move, -1 for the opponent '''
+        _player = board_obj.n_moves%2
+        _pairs = _marker_pairs(board_obj.markers)
+        if _pairs is None:
+            return np.subtract(board_obj.markers[:,:,_player], board_obj.markers[:,:,1-_player], dtype=float)
+        # one lookup per cell of both marker channels
+        return _state_values[_player].take(_pairs)
+
+    @staticmethod
+    def _active_box(board_obj: board_obj) -> tuple:
+        # (before the first move the old version read the zeroed last row of hist, so it reports box (0,0))
+        if board_obj.n_moves == 0:
+            return (0,0)
+        if board_obj.active < 0:
+            return (-1,-1)
+        return (board_obj.active//3, board_obj.active%3)
     
     @staticmethod # to be used infrequently, not efficient and rarely needed
     def get_winner(board_obj: board_obj) -> str:
         # check agent 1
-        for _line in ops.lines_mask:
-            if np.all(board_obj.miniboxes[:,:,0] * _line == _line):
-                return 'agent 1 wins'
+        if bitboard.line_table[board_obj.macro_bits[0]]:
+            return 'agent 1 wins'
 
         # check agent 2
-        for _line in ops.lines_mask:
-            if np.all(board_obj.miniboxes[:,:,1] * _line == _line):
-                return 'agent 2 wins'
+        if bitboard.line_table[board_obj.macro_bits[1]]:
+            return 'agent 2 wins'
 
         # check stale
-        if np.all(np.any(board_obj.miniboxes,axis=2)): # if all miniboards are filled with something
+        if (board_obj.macro_bits[0] | board_obj.macro_bits[1] | board_obj.macro_bits[2]) == bitboard.full_box: # if all miniboards are filled with something
             return 'stale'
 
         return 'game is ongoing'
+
+
+class board_view(Mapping):
+    '''
+    read-only view of a board with the keys of ops.pull_dictionary
+    board_state and valid_moves are computed on first access and cached until the board moves to
+    a different position (checked against board.key), active_box is read off the board; history,
+    markers and miniboxes are the live arrays
+    a board keeps its view (board_obj.view, see ops.pull_view), so a game pulls the same view
+    every turn and only pays for the keys the bot reads
+    view.board is the board_obj itself, for bots that can search on it without a copy
+    the cached values are shared by every read of their position (also after an undo back to it),
+    so board_state is write protected and valid_moves is a tuple
+    '''
+    __slots__ = ('board', '_state', '_state_key', '_moves', '_moves_key', '_markers', '_pairs')
+    _keys = ('board_state', 'active_box', 'valid_moves', 'history', 'n_moves', 'markers', 'miniboxes')
+
+    def __init__(self, board: board_obj) -> None:
+        self.board = board
+        self._state_key = None
+        self._moves_key = None
+        self._markers = None
+        self._pairs = None
+
+    def __getitem__(self, key: str):
+        board = self.board
+        # the cached values are tagged with the zobrist key of their position, one int compare checks them
+        if key == 'board_state':
+            if self._state_key != board.key:
+                if board.markers is not self._markers:
+                    # the view lives as long as the board, its markers are read through one kept uint16 view
+                    self._markers = board.markers
+                    self._pairs = _marker_pairs(board.markers)
+                if self._pairs is None:
+                    self._state = ops._board_state(board)
+                else:
+                    self._state = _state_values[board.n_moves%2].take(self._pairs)
+                self._state.setflags(write=False)
+                self._state_key = board.key
+            return self._state
+        if key == 'valid_moves':
+            if self._moves_key != board.key:
+                self._moves = tuple(ops.get_valid_moves(board))
+                self._moves_key = board.key
+            return self._moves
+        if key == 'active_box':
+            if board.active >= 0:
+                return (board.active//3, board.active%3)
+            return ops._active_box(board)
+        if key == 'history':
+            return board.hist
+        if key == 'n_moves':
+            return board.n_moves
+        if key == 'markers':
+            return board.markers
+        if key == 'miniboxes':
+            return board.miniboxes
+        raise KeyError(key)
+
+    def get(self, key: str, default=None):
+        if key in self._keys:
+            return self[key]
+        return default
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key) -> bool:
+        return key in self._keys
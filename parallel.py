@@ -0,0 +1,264 @@
+'''
+multi-core decisions: root parallel search over a warm pool of worker processes
+
+engine='mcts':      every worker grows its own tree from the same position with a different
+                    seed, the root visit counts are summed and the most visited move is played
+                    (each worker keeps its tree between moves, so tree reuse still works)
+engine='alphabeta': the legal root moves are dealt out to the workers, each runs the iterative
+                    deepening search_bot on its share, and the best score at the deepest depth
+                    every worker completed wins
+
+workers stop a safety margin before the move's deadline, the decision returns within
+thinking_time even if a worker is late (late answers are dropped)
+run at most one worker per core, oversubscribed workers miss the deadline
+daemonic processes can't start workers (arena and server pool workers are daemonic), there the
+bot searches in its own process with one engine bot, like workers=1
+benchmarks/scaling.py measures the work per move against the worker count
+
+    bot = root_parallel_bot(workers=4, thinking_time=0.4)
+    move = bot.move(ops.pull_view(board))
+    bot.close()
+'''
+import gc
+import os
+import random
+import multiprocessing
+import multiprocessing.connection
+from time import perf_counter, time
+
+import numpy as np
+
+import bitboard
+from board import board_obj
+from operations import ops
+from book import known_move, endgame_share
+from mcts import mcts_bot
+from search import search_bot, MATE_BOUND
+
+def _replay(history: bytes) -> board_obj:
+    board = board_obj()
+    for _idx in range(0, len(history), 2):
+        ops.make_move(board, (history[_idx], history[_idx+1]))
+    return board
+
+def _worker_loop(conn, engine: str, margin: float, engine_kwargs: dict) -> None:
+    ''' worker process: waits for (request id, history, seed, root_moves, deadline), answers with its root statistics '''
+    if engine == 'mcts':
+        bot = mcts_bot(**engine_kwargs)
+    else:
+        bot = search_bot(**engine_kwargs)
+    # one short search so the first real move doesn't pay for warming up
+    bot.thinking_time = 0.05
+    bot.get_best_move(board_obj())
+    # the bot's big tables never die, keep the garbage collector from walking them mid-move
+    gc.collect()
+    gc.freeze()
+    conn.send('ready')
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        request_id, history, seed, root_moves, deadline = msg
+        # the deadline is wall clock time, so a worker that starts late still answers in time
+        bot.thinking_time = max(deadline - time() - margin, 0.001)
+        random.seed(seed)
+        np.random.seed(seed)
+        board = _replay(history)
+        if engine == 'mcts':
+            bot.get_best_move(board)
+            first = bot.first_child[bot.root]
+            children = {bot.move_cell[_child]: bot.visits[_child]
+                        for _child in range(first, first + bot.n_children[bot.root])}
+            conn.send((request_id, children, bot.playouts))
+        else:
+            bot.get_best_move(board, root_moves)
+            conn.send((request_id, bot.iterations, bot.nodes))
+
+class root_parallel_bot:
+    '''
+    root parallel search with the standard move(board_dict) interface
+    workers defaults to the number of cores
+    '''
+    def __init__(self,
+                 name: str = 'Root Parallel',
+                 workers: int = None,
+                 thinking_time: float = 0.1,
+                 engine: str = 'mcts',
+                 margin: float = 0.025,
+                 seed: int = 0,
+                 book=None,
+                 endgame=None,
+                 **engine_kwargs) -> None:
+        if engine not in ('mcts', 'alphabeta'):
+            raise ValueError(f'unknown engine {engine}, use mcts or alphabeta')
+        self.name = name
+        self.workers = workers or os.cpu_count() or 1
+        self.thinking_time = thinking_time
+        self.engine = engine
+        self.margin = margin
+        self.seed = seed
+        self.book = book       # checked here, before the workers are asked
+        self.endgame = endgame
+        if engine == 'alphabeta':
+            # read the clock more often than a single search_bot, a late share is lost
+            engine_kwargs.setdefault('check_every', 256)
+        self.engine_kwargs = engine_kwargs
+        self._procs = []
+        self._conns = []
+        self._request_id = 0
+        self._local = None # the engine bot when the search runs in this process
+
+        # stats of the last move
+        self.work = 0         # playouts (mcts) or nodes (alphabeta) summed over the workers
+        self.elapsed = 0.0
+        self.answered = 0     # workers that answered in time
+
+    ''' ------------------ required function ---------------- '''
+
+    def move(self, board_dict: dict) -> tuple:
+        # searches on the game's own board when given a view, every move made is undone
+        return self.get_best_move(ops.board_from_dict(board_dict))
+
+    ''' ------------------ pool ---------------- '''
+
+    def start(self) -> None:
+        ''' starts the worker processes (done on the first move otherwise) '''
+        if self._procs or self._local is not None:
+            return
+        if multiprocessing.current_process().daemon:
+            # daemonic processes are not allowed to have children
+            self._local = (mcts_bot if self.engine == 'mcts' else search_bot)(**self.engine_kwargs)
+            return
+        for _ in range(self.workers):
+            parent_conn, child_conn = multiprocessing.Pipe()
+            proc = multiprocessing.Process(target=_worker_loop,
+                                           args=(child_conn, self.engine, self.margin, self.engine_kwargs),
+                                           daemon=True)
+            proc.start()
+            self._procs.append(proc)
+            self._conns.append(parent_conn)
+        # wait for the bots to be built, so the first move gets its full budget
+        for conn in self._conns:
+            conn.recv()
+
+    def close(self) -> None:
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+        for proc in self._procs:
+            proc.join(timeout=1)
+            if proc.is_alive():
+                proc.terminate()
+        self._procs = []
+        self._conns = []
+        self._local = None
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    ''' ------------------ search ---------------- '''
+
+    def get_best_move(self, board: board_obj) -> tuple:
+        start = perf_counter()
+        # forced, book and solved moves do no work, don't report the last move's
+        self.work = 0
+        self.answered = 0
+        self.elapsed = 0.0
+        self.start()
+        legal_moves = ops.get_valid_moves(board)
+        if len(legal_moves) == 1:
+            self.elapsed = perf_counter() - start
+            return legal_moves[0]
+        move = known_move(board, self.book, self.endgame, self.thinking_time * endgame_share)
+        if move is not None:
+            self.elapsed = perf_counter() - start
+            return move
+        if self._local is not None:
+            return self._local_move(board, start)
+
+        self._request_id += 1
+        history = board.hist[:board.n_moves].tobytes()
+        # whatever the endgame solver used is gone
+        wall_deadline = time() + self.thinking_time - (perf_counter() - start)
+        seed_base = (self.seed * 1000003 + board.n_moves * 7919 + self._request_id) & 0xffffffff
+        busy = []
+        for _idx, conn in enumerate(self._conns):
+            if self.engine == 'mcts':
+                root_moves = None
+            else:
+                root_moves = legal_moves[_idx::self.workers]
+                if not root_moves:
+                    continue
+            conn.send((self._request_id, history, (seed_base + _idx * 104729) & 0xffffffff, root_moves, wall_deadline))
+            busy.append(conn)
+
+        # collect until every worker answered or the time is up
+        deadline = start + self.thinking_time
+        answers = []
+        waiting = list(busy)
+        while waiting:
+            ready = multiprocessing.connection.wait(waiting, timeout=max(deadline - perf_counter(), 0))
+            if not ready:
+                break
+            for conn in ready:
+                answer = conn.recv()
+                if answer[0] == self._request_id: # older answers are from moves that timed out
+                    answers.append(answer)
+                    waiting.remove(conn)
+        self.answered = len(answers)
+        self.elapsed = perf_counter() - start
+
+        if self.engine == 'mcts':
+            move = self._merge_visits(answers)
+        else:
+            move = self._merge_scores(answers)
+        return move if move is not None else legal_moves[0]
+
+    def _local_move(self, board: board_obj, start: float) -> tuple:
+        ''' the search without workers, in what is left of thinking_time '''
+        bot = self._local
+        bot.thinking_time = max(self.thinking_time - (perf_counter() - start), 0.001)
+        move = bot.get_best_move(board)
+        self.work = bot.playouts if self.engine == 'mcts' else bot.nodes
+        self.answered = 1
+        self.elapsed = perf_counter() - start
+        return move
+
+    def _merge_visits(self, answers: list) -> tuple:
+        visits = {}
+        self.work = 0
+        for _, children, playouts in answers:
+            self.work += playouts
+            for cell, count in children.items():
+                visits[cell] = visits.get(cell, 0) + count
+        if not visits:
+            return None
+        return bitboard.cell_pos[max(visits, key=visits.get)]
+
+    def _merge_scores(self, answers: list) -> tuple:
+        self.work = sum(_answer[2] for _answer in answers)
+        results = [_answer[1] for _answer in answers if _answer[1]]
+        if not results:
+            return None
+        # a proven win anywhere is played at once
+        for iterations in results:
+            depth, move, score = iterations[-1]
+            if score >= MATE_BOUND:
+                return move
+        # otherwise compare every share at the deepest depth they all finished
+        # (shares that are proven lost stop early, they don't limit the depth)
+        alive = [_it for _it in results if _it[-1][2] > -MATE_BOUND]
+        if not alive:
+            return max(results, key=lambda _it: _it[-1][2])[-1][1]
+        depth = min(_it[-1][0] for _it in alive)
+        best_move, best_score = None, None
+        for iterations in alive:
+            _, move, score = iterations[depth - 1]
+            if best_score is None or score > best_score:
+                best_move, best_score = move, score
+        return best_move
@@ -0,0 +1,200 @@
+'''
+opt-in instrumentation of the ops hot paths (and any other methods you point it at)
+
+while enabled, every public ops static method is swapped for a timing wrapper; disable()
+puts the original functions back, so a disabled profiler costs nothing
+per method: call count, total time and a per-call latency histogram
+sections (profiler.section('name')) label the caller's own code, the time of every call is
+also kept under its stack of sections/methods for flamegraphs (collapsed stack format)
+
+    prof = profiler(targets=[(search_bot, 'search')])
+    with prof:
+        with prof.section('my_bot'):
+            bot.move(ops.pull_view(board))
+    print(prof.format_report())
+    prof.export_collapsed('profile.folded')   # flamegraph.pl profile.folded > profile.svg
+
+arena.run_match(..., instrument=True) profiles every game and adds per-move records
+'''
+import json
+from bisect import bisect_right
+from contextlib import contextmanager
+from time import perf_counter
+
+from operations import ops
+
+# per-call latency histogram bins: 20 per decade from 100ns to 100s (same as arena.latency_bins)
+latency_bins = [10 ** (-7 + _i / 20) for _i in range(181)]
+
+def ops_methods() -> list:
+    ''' names of the public static methods of ops '''
+    return [_name for _name, _attr in vars(ops).items() if isinstance(_attr, staticmethod) and not _name.startswith('_')]
+
+class profiler:
+    '''
+    targets: extra (class or module, method name) pairs to time next to the ops methods
+    counters: free counters (e.g. search nodes), add with count()
+    '''
+    def __init__(self, targets: list = None, include_ops: bool = True) -> None:
+        self.targets = [(ops, _name) for _name in ops_methods()] if include_ops else []
+        self.targets += list(targets or [])
+        self.calls = {}     # label -> number of calls
+        self.seconds = {}   # label -> total time
+        self.hist = {}      # label -> per-call latency counts, len(latency_bins)+1 bins
+        self.flame = {}     # stack of labels (tuple) -> time spent in its last frame itself
+        self.counters = {}
+        self.enabled = False
+        self._stack = [[(), 0.0]] # [path, time of the finished children] per open frame
+        self._saved = []
+
+    ''' ------------------ switching on and off ---------------- '''
+
+    def enable(self) -> None:
+        if self.enabled:
+            return
+        for owner, name in self.targets:
+            raw = vars(owner)[name] if isinstance(owner, type) else getattr(owner, name)
+            self._saved.append((owner, name, raw))
+            fn = raw.__func__ if isinstance(raw, staticmethod) else raw
+            wrapper = self._wrap(f'{getattr(owner, "__name__", owner)}.{name}', fn)
+            setattr(owner, name, staticmethod(wrapper) if isinstance(raw, staticmethod) else wrapper)
+        self.enabled = True
+
+    def disable(self) -> None:
+        for owner, name, raw in reversed(self._saved):
+            setattr(owner, name, raw)
+        self._saved = []
+        self.enabled = False
+
+    def __enter__(self):
+        self.enable()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.disable()
+
+    ''' ------------------ recording ---------------- '''
+
+    def _wrap(self, label: str, fn):
+        for _table, _empty in ((self.calls, 0), (self.seconds, 0.0)):
+            _table.setdefault(label, _empty)
+        self.hist.setdefault(label, [0]*(len(latency_bins)+1))
+        record = self._record
+
+        def wrapper(*args, **kwargs):
+            frame = self._push(label)
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                record(label, frame, perf_counter() - start)
+        wrapper.__wrapped__ = fn
+        wrapper.__name__ = getattr(fn, '__name__', label)
+        return wrapper
+
+    def _push(self, label: str) -> list:
+        frame = [self._stack[-1][0] + (label,), 0.0]
+        self._stack.append(frame)
+        return frame
+
+    def _record(self, label: str, frame: list, elapsed: float) -> None:
+        self._stack.pop()
+        self._stack[-1][1] += elapsed
+        self.calls[label] += 1
+        self.seconds[label] += elapsed
+        self.hist[label][bisect_right(latency_bins, elapsed)] += 1
+        path = frame[0]
+        self.flame[path] = self.flame.get(path, 0.0) + elapsed - frame[1]
+
+    @contextmanager
+    def section(self, label: str):
+        ''' times a block of the caller's own code, ops calls inside it nest under label '''
+        for _table, _empty in ((self.calls, 0), (self.seconds, 0.0)):
+            _table.setdefault(label, _empty)
+        self.hist.setdefault(label, [0]*(len(latency_bins)+1))
+        frame = self._push(label)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self._record(label, frame, perf_counter() - start)
+
+    def count(self, name: str, n: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self) -> None:
+        for label in self.calls:
+            self.calls[label] = 0
+            self.seconds[label] = 0.0
+            self.hist[label] = [0]*(len(latency_bins)+1)
+        self.flame = {}
+        self.counters = {}
+
+    ''' ------------------ combining (e.g. over worker processes) ---------------- '''
+
+    def state(self) -> dict:
+        ''' plain, picklable copy of the recorded numbers '''
+        return {'calls': dict(self.calls), 'seconds': dict(self.seconds),
+                'hist': {_label: list(_hist) for _label, _hist in self.hist.items()},
+                'flame': dict(self.flame), 'counters': dict(self.counters)}
+
+    def merge(self, state: dict) -> None:
+        ''' adds the numbers of another profiler's state() '''
+        for label, calls in state['calls'].items():
+            self.calls[label] = self.calls.get(label, 0) + calls
+            self.seconds[label] = self.seconds.get(label, 0.0) + state['seconds'][label]
+            hist = self.hist.setdefault(label, [0]*(len(latency_bins)+1))
+            for _bin, _count in enumerate(state['hist'][label]):
+                hist[_bin] += _count
+        for path, seconds in state['flame'].items():
+            self.flame[path] = self.flame.get(path, 0.0) + seconds
+        for name, n in state['counters'].items():
+            self.count(name, n)
+
+    ''' ------------------ export ---------------- '''
+
+    def percentile(self, label: str, percentile: float) -> float:
+        ''' per-call latency percentile (seconds) from the histogram, accurate to the bin width (~12%) '''
+        hist = self.hist[label]
+        target = sum(hist) * percentile / 100
+        seen = 0
+        for _bin, _count in enumerate(hist):
+            seen += _count
+            if seen >= target and _count:
+                return latency_bins[min(_bin, len(latency_bins)-1)]
+        return float('nan')
+
+    def report(self) -> dict:
+        ''' label -> calls, seconds, mean and percentile latencies (in microseconds) '''
+        out = {}
+        for label, calls in self.calls.items():
+            if not calls:
+                continue
+            out[label] = {'calls': calls,
+                          'seconds': self.seconds[label],
+                          'mean_us': self.seconds[label] / calls * 1e6,
+                          **{f'p{_p}_us': self.percentile(label, _p) * 1e6 for _p in (50, 90, 99)}}
+        return {'methods': out, 'counters': dict(self.counters)}
+
+    def format_report(self) -> str:
+        ''' human readable table, slowest in total first '''
+        methods = self.report()['methods']
+        lines = [f"{'':32s}{'calls':>10s}{'total s':>10s}{'mean us':>10s}{'p50 us':>10s}{'p99 us':>10s}"]
+        for label, row in sorted(methods.items(), key=lambda _item: -_item[1]['seconds']):
+            lines.append(f"{label:32s}{row['calls']:>10d}{row['seconds']:>10.3f}{row['mean_us']:>10.2f}"
+                         f"{row['p50_us']:>10.2f}{row['p99_us']:>10.2f}")
+        for name, n in self.counters.items():
+            lines.append(f'{name}: {n}')
+        return '\n'.join(lines)
+
+    def export_json(self, path: str) -> None:
+        with open(path, 'w') as f:
+            json.dump(self.report(), f, indent=1)
+
+    def export_collapsed(self, path: str) -> None:
+        ''' collapsed stacks ("a;b;c microseconds" per line), the input of flamegraph.pl / speedscope '''
+        with open(path, 'w') as f:
+            for stack, seconds in sorted(self.flame.items()):
+                micros = int(round(seconds * 1e6))
+                if micros > 0:
+                    f.write(';'.join(stack) + f' {micros}\n')
@@ -0,0 +1,322 @@
+'''
+iterative deepening alpha-beta search bot
+
+negamax with a transposition table, principal variation search (the stored
+best move goes first and the rest get a null window), killer and history move
+ordering, aspiration windows around the last iteration's score, and a clock
+check every few hundred nodes instead of at every node (by default the interval
+follows the measured search speed, about one check per clock_interval seconds)
+
+    bot = search_bot(thinking_time=0.4)
+    move = bot.move(ops.pull_view(board))
+'''
+from time import perf_counter
+
+import bitboard
+from board import board_obj
+from operations import ops
+from book import known_move, endgame_share
+from transposition import transposition_table, EXACT, LOWER, UPPER
+
+WIN = 100000          # score of a won game (minus the ply it is won at)
+INF = 1000000         # larger than any score
+MATE_BOUND = WIN - 81 # scores beyond this are wins/losses
+
+_cell_index = {(_r, _c): _r*9 + _c for _r in range(9) for _c in range(9)}
+
+clock_interval = 0.002 # seconds between clock checks when check_every adapts to the search speed
+
+def _check_mask(check_every: int) -> int:
+    ''' check_every rounded down to a power of two, minus one (the clock is read when nodes & mask == 0) '''
+    check_every = int(check_every)
+    if check_every < 1:
+        raise ValueError(f'check_every must be at least 1, got {check_every}')
+    return (1 << (check_every.bit_length() - 1)) - 1
+
+class search_bot:
+    '''
+    alpha-beta search with the standard move(board_dict) interface
+    thinking_time is the budget per move in seconds
+    check_every: nodes between clock checks (rounded down to a power of two), None adapts it
+                 after every move to about one check per clock_interval seconds
+    '''
+    def __init__(self,
+                 name: str = 'Searcher',
+                 thinking_time: float = 0.1,
+                 max_depth: int = 81,
+                 tt_size_log2: int = 20,
+                 aspiration_window: int = 50,
+                 check_every: int = None,
+                 book=None,
+                 endgame=None,
+                 evaluator=None) -> None:
+        self.name = name
+        self.thinking_time = thinking_time
+        self.max_depth = max_depth
+        self.aspiration_window = aspiration_window
+        self.adaptive_check = check_every is None
+        self.check_mask = _check_mask(256 if check_every is None else check_every)
+        self.tt = transposition_table(tt_size_log2)
+        self.book = book       # book.opening_book, answers known openings
+        self.endgame = endgame # book.endgame_solver, takes over near the end
+        self.evaluator = evaluator # evaluation.evaluator, replaces the won box count at the leaves
+
+        # move ordering state
+        self.killers = [[None, None] for _ in range(82)]
+        self.history = [[0]*81, [0]*81]
+
+        # search state and stats of the last move
+        self.deadline = 0.0
+        self.stopped = False
+        self.nodes = 0
+        self.elapsed = 0.0
+        self.reached_depth = 0
+        self.score = 0
+        self.pv = []
+        self.iterations = [] # (depth, move, score) of every completed iteration
+        self._root_move = None
+        self._root_moves = None
+        self._best_move = None
+
+    ''' ------------------ required function ---------------- '''
+
+    def move(self, board_dict: dict) -> tuple:
+        # searches on the game's own board when given a view, every move made is undone
+        return self.get_best_move(ops.board_from_dict(board_dict))
+
+    ''' ------------------ search ---------------- '''
+
+    def get_best_move(self, board: board_obj, root_moves: list = None) -> tuple:
+        ''' iterative deepening until the time runs out, returns the best move of the last full iteration
+        root_moves limits the search to some of the legal moves (see parallel.py) '''
+        start = perf_counter()
+        self.deadline = start + self.thinking_time
+        self.stopped = False
+        self.nodes = 0
+        self.reached_depth = 0
+        self.iterations = []
+        self.tt.new_search()
+        for _ply in self.killers:
+            _ply[0] = _ply[1] = None
+        for _player in self.history:
+            for _cell in range(81):
+                _player[_cell] >>= 2 # keep some ordering knowledge from the last move
+
+        legal_moves = ops.get_valid_moves(board) if root_moves is None else list(root_moves)
+        self._root_moves = root_moves
+        self._best_move = legal_moves[0]
+        if len(legal_moves) == 1 and root_moves is None:
+            self.elapsed = perf_counter() - start
+            return self._best_move
+        if root_moves is None:
+            move = known_move(board, self.book, self.endgame, self.thinking_time * endgame_share)
+            if move is not None:
+                self.elapsed = perf_counter() - start
+                return move
+
+        if self.evaluator is not None:
+            self.evaluator.attach(board)
+        try:
+            score = self._deepen(board)
+        finally:
+            if self.evaluator is not None:
+                self.evaluator.detach(board)
+
+        self.score = score
+        self.elapsed = perf_counter() - start
+        if self.adaptive_check and self.elapsed > 0.01:
+            # overshoot is at most one interval, keep it near clock_interval whatever the speed
+            self.check_mask = _check_mask(min(max(self.nodes / self.elapsed * clock_interval, 16), 2048))
+        self.pv = self.principal_variation(board)
+        return self._best_move
+
+    def _deepen(self, board: board_obj) -> int:
+        ''' the iterations of get_best_move, sets self._best_move and returns its score '''
+        score = 0
+        for depth in range(1, self.max_depth + 1):
+            # aspiration window around the last score, widened to the full window on a fail
+            if depth >= 3 and abs(score) < MATE_BOUND:
+                alpha, beta = score - self.aspiration_window, score + self.aspiration_window
+            else:
+                alpha, beta = -INF, INF
+            while True:
+                value = self.search(board, depth, alpha, beta, 0)
+                if self.stopped:
+                    break
+                if value <= alpha:
+                    alpha = -INF
+                elif value >= beta:
+                    beta = INF
+                else:
+                    break
+            if self.stopped:
+                break
+            self._best_move, score = self._root_move, value
+            self.reached_depth = depth
+            self.iterations.append((depth, self._best_move, score))
+            # a forced result needs no deeper search, and nothing deeper exists past the end of the game
+            if abs(score) >= MATE_BOUND or depth >= 81 - board.n_moves:
+                break
+            if perf_counter() > self.deadline:
+                break
+        return score
+
+    def search(self, board: board_obj, depth: int, alpha: int, beta: int, ply: int) -> int:
+        ''' negamax, scores are from the point of view of the player to move '''
+        self.nodes += 1
+        if not self.nodes & self.check_mask and perf_counter() > self.deadline:
+            self.stopped = True
+        if self.stopped:
+            return 0
+
+        # the game ended on the last move: either that player made a line or it's a draw
+        if board.n_moves and ops.check_game_finished(board):
+            if bitboard.line_table[board.macro_bits[(board.n_moves-1)%2]]:
+                return -WIN + ply
+            return 0
+        if depth <= 0:
+            return self.evaluate(board)
+
+        # transposition table cutoffs (never at the root, it has to set the move)
+        tt = self.tt
+        slot = tt.probe(board.key)
+        tt_move = None
+        if slot >= 0:
+            tt_move = tt.moves[slot]
+            if ply > 0 and tt.depths[slot] >= depth:
+                value = self._from_tt(tt.values[slot], ply)
+                flag = tt.flags[slot]
+                if flag == EXACT:
+                    return value
+                if flag == LOWER and value >= beta:
+                    return value
+                if flag == UPPER and value <= alpha:
+                    return value
+
+        alpha_orig = alpha
+        player = board.n_moves%2
+        if ply == 0 and self._root_moves is not None:
+            moves = self.order_moves(board, list(self._root_moves), tt_move, ply)
+        else:
+            moves = self.order_moves(board, ops.get_valid_moves(board), tt_move, ply)
+        best_value = -INF
+        best_move = moves[0]
+        for idx, move in enumerate(moves):
+            ops.make_move(board, move)
+            if idx == 0:
+                value = -self.search(board, depth-1, -beta, -alpha, ply+1)
+            else:
+                # principal variation search: prove the move is worse with a null window, re-search if not
+                value = -self.search(board, depth-1, -alpha-1, -alpha, ply+1)
+                if alpha < value < beta:
+                    value = -self.search(board, depth-1, -beta, -alpha, ply+1)
+            ops.undo_move(board)
+            if self.stopped:
+                return 0
+
+            if value > best_value:
+                best_value = value
+                best_move = move
+                if ply == 0:
+                    self._root_move = move
+                if value > alpha:
+                    alpha = value
+                    if alpha >= beta:
+                        self._record_cutoff(board, move, player, depth, ply)
+                        break
+
+        if best_value <= alpha_orig:
+            flag = UPPER
+        elif best_value >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        tt.store(board.key, depth, self._to_tt(best_value, ply), flag, best_move)
+        return best_value
+
+    ''' ------------------ move ordering ---------------- '''
+
+    def order_moves(self, board: board_obj, moves: list, tt_move, ply: int) -> list:
+        '''
+        table move first, then moves that win their box, then killers, then by history score
+        '''
+        player = board.n_moves%2
+        own_bits = board.box_bits[player]
+        killers = self.killers[ply]
+        history = self.history[player]
+
+        def _priority(move):
+            if move == tt_move:
+                return 1 << 40
+            _cell = _cell_index[move]
+            _box = bitboard.cell_box[_cell]
+            if bitboard.completer_table[own_bits[_box]] & bitboard.cell_bit[_cell]:
+                return 1 << 39
+            if move == killers[0]:
+                return 1 << 38
+            if move == killers[1]:
+                return 1 << 37
+            return history[_cell]
+
+        moves.sort(key=_priority, reverse=True)
+        return moves
+
+    def _record_cutoff(self, board: board_obj, move: tuple, player: int, depth: int, ply: int) -> None:
+        ''' updates killers and history for a move that caused a beta cutoff '''
+        _cell = _cell_index[move]
+        if bitboard.completer_table[board.box_bits[player][bitboard.cell_box[_cell]]] & bitboard.cell_bit[_cell]:
+            return # box-winning moves are already ordered early
+        killers = self.killers[ply]
+        if killers[0] != move:
+            killers[1] = killers[0]
+            killers[0] = move
+        self.history[player][_cell] += depth * depth
+
+    ''' ------------------ evaluation ---------------- '''
+
+    def evaluate(self, board: board_obj) -> int:
+        ''' won boxes of the player to move minus the opponent's, or the evaluator's score '''
+        if self.evaluator is not None:
+            return self.evaluator.evaluate(board)
+        player = board.n_moves%2
+        return 100 * (board.macro_bits[player].bit_count() - board.macro_bits[1-player].bit_count())
+
+    ''' ------------------ helpers ---------------- '''
+
+    @staticmethod
+    def _to_tt(value: int, ply: int) -> int:
+        # win/loss scores are stored relative to the node, not the root
+        if value >= MATE_BOUND:
+            return value + ply
+        if value <= -MATE_BOUND:
+            return value - ply
+        return value
+
+    @staticmethod
+    def _from_tt(value: int, ply: int) -> int:
+        if value >= MATE_BOUND:
+            return value - ply
+        if value <= -MATE_BOUND:
+            return value + ply
+        return value
+
+    def principal_variation(self, board: board_obj, max_len: int = 20) -> list:
+        ''' follows the stored best moves from board (restores board afterwards) '''
+        pv = []
+        seen = set()
+        while len(pv) < max_len and board.key not in seen:
+            if board.n_moves and ops.check_game_finished(board):
+                break
+            move = self.tt.best_move(board.key)
+            if move is None or not ops.check_move_is_valid(board, move):
+                break
+            seen.add(board.key)
+            pv.append(move)
+            ops.make_move(board, move)
+        for _ in pv:
+            ops.undo_move(board)
+        return pv
+
+    def nodes_per_second(self) -> float:
+        ''' search speed of the last move '''
+        return self.nodes / max(self.elapsed, 1e-9)
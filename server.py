@@ -0,0 +1,502 @@
+'''
+match server: many concurrent games on a warm pool of bot worker processes, with hard per-move deadlines
+
+the server owns every board and checks every move with ops, the bots only ever see a position
+each worker process builds one instance of every registered agent at start (and plays one move
+with each to warm it up), so games never wait for imports or table builds; a worker serves
+whichever game asks next, bots are reused across games
+a move gets deadline seconds from the moment it reaches a worker: a bot that is late (or raises,
+or returns an invalid move) forfeits the game, and a late worker is killed and replaced, so a
+hung bot never holds up the other games
+
+protocol: one JSON object per line over TCP (or a unix socket), games are in the vis_tools.cvt_vis_app
+encoding (one character per move, chr(row*9 + col + 32)), replies carry the id of their request
+and come back as they finish, so a client can keep hundreds of games in flight on one connection
+    {"id": 1, "cmd": "play", "agents": ["search", "mcts"], "opening_moves": 4, "seed": 7}
+        -> {"id": 1, "result": 0, "forfeit": null, "reason": null, "game": "...", "seconds": [[...], [...]]}
+           result 0 first agent won, 1 second agent won, 2 draw (as arena.play_game)
+    {"id": 2, "cmd": "move", "agent": "search", "game": "..."}
+        -> {"id": 2, "move": "...", "seconds": 0.1}     (move is one character, null if the bot failed)
+    {"id": 3, "cmd": "stats"}
+        -> {"id": 3, "games_per_sec": ..., "moves_per_sec": ..., "active_games": ..., ...}
+    errors come back as {"id": ..., "error": "..."}
+
+    python server.py --port 8765 --workers 8 --deadline 0.5 --agent mine=my_bots:my_bot
+
+    # or from python / a notebook, the client helper keeps requests in flight concurrently
+    async def ladder():
+        async with match_client(port=8765) as client:
+            games = [client.play('search', 'mcts', seed=_s) for _s in range(500)]
+            return await asyncio.gather(*games)
+    results = asyncio.run(ladder())
+'''
+import argparse
+import asyncio
+import gc
+import importlib
+import json
+import multiprocessing
+import os
+import random
+from collections import deque
+from time import perf_counter, time
+
+import numpy as np
+
+from board import board_obj
+from operations import ops
+from gamelog import replay
+from line_completer import line_completer_bot, fast_line_completer_bot
+from mcts import mcts_bot
+from search import search_bot
+
+default_agents = {'line_completer': line_completer_bot,
+                  'fast_line_completer': fast_line_completer_bot,
+                  'search': search_bot,
+                  'mcts': mcts_bot}
+
+def encode_game(board: board_obj) -> str:
+    ''' board -> game string (same as vis_tools.cvt_vis_app, without its plotting imports) '''
+    return ''.join(chr(int(_p[0])*9 + int(_p[1]) + 32) for _p in board.hist[:board.n_moves])
+
+def decode_game(game: str) -> bytes:
+    ''' game string -> cells, checked to be on the board (not that the moves are legal) '''
+    cells = [ord(_c) - 32 for _c in game]
+    if any(not 0 <= _cell <= 80 for _cell in cells):
+        raise ValueError('game strings use chr(row*9 + col + 32) per move')
+    return bytes(cells)
+
+def load_agent(spec: str) -> tuple:
+    ''' "name=module:attribute" -> (name, factory) '''
+    name, _, target = spec.partition('=')
+    module, _, attr = target.partition(':')
+    if not (name and module and attr):
+        raise ValueError(f'agent spec {spec} is not name=module:attribute')
+    return name, getattr(importlib.import_module(module), attr)
+
+''' ------------------ worker processes ---------------- '''
+
+def _worker_loop(conn, agents: dict, seed: int) -> None:
+    ''' worker process: answers (request id, agent name, cells) with (request id, cell or None, error) '''
+    # forked workers start with the parent's random state, give each its own
+    random.seed(seed)
+    np.random.seed(seed & 0xffffffff)
+    bots = {_name: _factory() for _name, _factory in agents.items()}
+    for bot in bots.values():
+        try:
+            bot.move(ops.pull_view(board_obj()))
+        except Exception:
+            pass # a bot that fails shows it in its games
+    # the bots' tables live as long as the worker, keep the garbage collector from walking them mid-move
+    gc.collect()
+    gc.freeze()
+    conn.send('ready')
+    while True:
+        msg = conn.recv()
+        if msg is None:
+            break
+        request_id, name, cells = msg
+        try:
+            board = replay(cells)
+            move = bots[name].move(ops.pull_view(board))
+            # checked before it is flattened, an off-board (0, 40) would make a legal looking cell 40
+            if not ops.check_move_is_valid(board, move):
+                conn.send((request_id, None, f'invalid move {move!r}'))
+                continue
+            conn.send((request_id, int(move[0])*9 + int(move[1]), None))
+        except Exception as err:
+            conn.send((request_id, None, f'{type(err).__name__}: {err}'))
+
+class _worker:
+    __slots__ = ('proc', 'conn', 'future', 'request_id', 'ready')
+
+    def __init__(self, proc, conn) -> None:
+        self.proc = proc
+        self.conn = conn
+        self.future = None
+        self.request_id = 0
+        self.ready = False
+
+class bot_pool:
+    '''
+    warm worker processes that every game shares, use inside a running event loop
+    agents: name -> class (or picklable zero-argument factory), one instance per worker
+    a worker that misses a deadline or dies is replaced in the background
+    '''
+    def __init__(self, agents: dict = None, workers: int = None, seed: int = 0) -> None:
+        self.agents = dict(agents or default_agents)
+        self.workers = workers or os.cpu_count() or 1
+        self.seed = seed
+        self.replaced = 0
+        self.failed = 0   # workers that died before they were warm (a bot that can't be built)
+        self._spawned = 0
+        self._all = set()
+        self._free = None
+        self._request_id = 0
+
+    async def start(self) -> None:
+        ''' starts the workers and waits until every one is warm '''
+        self._free = asyncio.Queue()
+        for _ in range(self.workers):
+            self._spawn()
+        while self._free.qsize() + self.failed < self.workers:
+            await asyncio.sleep(0.01)
+        if self.failed:
+            self.close()
+            raise RuntimeError(f'{self.failed} bot worker(s) died while building the agents')
+
+    def _spawn(self) -> None:
+        parent_conn, child_conn = multiprocessing.Pipe()
+        proc = multiprocessing.get_context().Process(target=_worker_loop,
+                                                     args=(child_conn, self.agents, self.seed * 1000003 + self._spawned),
+                                                     daemon=True)
+        proc.start()
+        child_conn.close()
+        self._spawned += 1
+        worker = _worker(proc, parent_conn)
+        self._all.add(worker)
+        asyncio.get_running_loop().add_reader(parent_conn.fileno(), self._on_readable, worker)
+
+    def _on_readable(self, worker: _worker) -> None:
+        try:
+            msg = worker.conn.recv()
+        except (EOFError, OSError):
+            self._retire(worker, 'the worker process died')
+            if worker.ready:
+                self._spawn()
+            else:
+                self.failed += 1 # a replacement would die the same way
+            return
+        if msg == 'ready':
+            worker.ready = True
+            self._free.put_nowait(worker)
+        elif worker.future is not None and msg[0] == worker.request_id and not worker.future.done():
+            worker.future.set_result(msg[1:])
+
+    def _retire(self, worker: _worker, reason: str) -> None:
+        if worker not in self._all:
+            return
+        self._all.discard(worker)
+        asyncio.get_running_loop().remove_reader(worker.conn.fileno())
+        if worker.future is not None and not worker.future.done():
+            worker.future.set_result((None, reason))
+        worker.proc.kill()
+        worker.conn.close()
+        worker.proc.join(timeout=0) # reaped later by multiprocessing if not yet gone
+
+    async def move(self, agent: str, cells: bytes, deadline: float) -> tuple:
+        '''
+        (cell, seconds, error) of agent's move in the position after cells, cell is None if the bot
+        failed or missed the deadline (seconds counted from when a worker got the position)
+        '''
+        if agent not in self.agents:
+            raise KeyError(f'unknown agent {agent}, use one of {sorted(self.agents)}')
+        while True:
+            if not self._all:
+                raise RuntimeError('no bot workers left')
+            worker = await self._free.get()
+            if worker in self._all: # not one that died while it waited in the queue
+                break
+        self._request_id += 1
+        worker.request_id = self._request_id
+        worker.future = asyncio.get_running_loop().create_future()
+        start = perf_counter()
+        worker.conn.send((self._request_id, agent, cells))
+        try:
+            cell, error = await asyncio.wait_for(asyncio.shield(worker.future), deadline)
+        except asyncio.TimeoutError:
+            cell, error = None, f'missed the {deadline}s deadline'
+        seconds = perf_counter() - start
+        if not worker.future.done():
+            # the bot may never come back, a fresh worker is cheaper than waiting
+            self._retire(worker, 'deadline')
+            self.replaced += 1
+            self._spawn()
+            return cell, seconds, error
+        worker.future = None
+        if worker in self._all:
+            self._free.put_nowait(worker)
+        return cell, seconds, error
+
+    def close(self) -> None:
+        for worker in list(self._all):
+            try:
+                worker.conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self._retire(worker, 'closed')
+
+''' ------------------ games ---------------- '''
+
+class throughput:
+    ''' games and moves finished over the last window seconds, plus running totals '''
+    def __init__(self, window: float = 10.0) -> None:
+        self.window = window
+        self.started = time()
+        self.totals = {'games': 0, 'moves': 0, 'forfeits': 0, 'timeouts': 0}
+        self.active_games = 0
+        self._games = deque()
+        self._moves = deque()
+
+    def _add(self, times: deque) -> None:
+        now = time()
+        times.append(now)
+        while times[0] < now - self.window:
+            times.popleft()
+
+    def add_move(self) -> None:
+        self.totals['moves'] += 1
+        self._add(self._moves)
+
+    def add_game(self, game: dict) -> None:
+        self.totals['games'] += 1
+        if game['forfeit'] is not None:
+            self.totals['forfeits'] += 1
+            if game['reason'].startswith('missed'):
+                self.totals['timeouts'] += 1
+        self._add(self._games)
+
+    def snapshot(self) -> dict:
+        now = time()
+        for times in (self._games, self._moves):
+            while times and times[0] < now - self.window:
+                times.popleft()
+        span = min(self.window, now - self.started) or 1e-9
+        return {'games_per_sec': len(self._games) / span,
+                'moves_per_sec': len(self._moves) / span,
+                'active_games': self.active_games,
+                **self.totals,
+                'uptime': now - self.started}
+
+class match_server:
+    '''
+    plays games between pooled agents, the rules and the clock are the server's
+    deadline: hard limit in seconds on every move
+    '''
+    def __init__(self, agents: dict = None, workers: int = None, deadline: float = 0.5,
+                 seed: int = 0, window: float = 10.0) -> None:
+        self.pool = bot_pool(agents, workers, seed)
+        self.deadline = deadline
+        self.stats = throughput(window)
+        self._servers = []
+
+    async def play(self, agent1: str, agent2: str, opening_moves: int = 4, seed: int = None) -> dict:
+        '''
+        one game, agent1 moves first after a seeded random opening (as arena.play_game)
+        result: 0 agent1 won, 1 agent2 won, 2 draw; a failed move forfeits, 'forfeit' holds the
+        index of the offending agent and 'reason' why
+        '''
+        for agent in (agent1, agent2):
+            if agent not in self.pool.agents:
+                raise KeyError(f'unknown agent {agent}, use one of {sorted(self.pool.agents)}')
+        board = board_obj()
+        rng = random.Random(seed)
+        while board.n_moves < opening_moves:
+            legal_moves = ops.get_valid_moves(board)
+            ops.make_move(board, legal_moves[rng.randrange(len(legal_moves))])
+            if ops.check_game_finished(board):
+                board = board_obj()
+
+        agents = (agent1, agent2)
+        seconds = ([], [])
+        first = board.n_moves%2
+        self.stats.active_games += 1
+        try:
+            while True:
+                idx = (board.n_moves - first)%2
+                cells = board.hist[:board.n_moves, 0] * 9 + board.hist[:board.n_moves, 1]
+                cell, elapsed, error = await self.pool.move(agents[idx], cells.astype(np.uint8).tobytes(), self.deadline)
+                seconds[idx].append(elapsed)
+                if cell is None or cell > 80 or not ops.check_move_is_valid(board, (cell//9, cell%9)):
+                    game = {'result': 1 - idx, 'forfeit': idx, 'reason': error or f'invalid move {cell}'}
+                    break
+                ops.make_move(board, (cell//9, cell%9))
+                self.stats.add_move()
+                if ops.check_game_finished(board):
+                    # the last mover made the line
+                    game = {'result': idx if 'wins' in ops.get_winner(board) else 2, 'forfeit': None, 'reason': None}
+                    break
+        finally:
+            self.stats.active_games -= 1
+        game.update(game=encode_game(board), seconds=seconds)
+        self.stats.add_game(game)
+        return game
+
+    ''' ------------------ protocol ---------------- '''
+
+    async def _handle(self, reader, writer) -> None:
+        tasks = set()
+        lock = asyncio.Lock()
+
+        async def reply(msg: dict) -> None:
+            async with lock:
+                writer.write(json.dumps(msg).encode() + b'\n')
+                await writer.drain()
+
+        async def answer(request: dict) -> None:
+            try:
+                out = await self._dispatch(request)
+            except Exception as err:
+                out = {'error': f'{type(err).__name__}: {err}'}
+            await reply({'id': request.get('id'), **out})
+
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('requests are JSON objects')
+                except ValueError as err:
+                    await reply({'id': None, 'error': f'bad request: {err}'})
+                    continue
+                task = asyncio.ensure_future(answer(request))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            # the client stopped sending, finish its games before hanging up
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (ConnectionError, asyncio.CancelledError):
+            # the client went away, or the server is shutting down
+            for task in tasks:
+                task.cancel()
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request: dict) -> dict:
+        cmd = request.get('cmd')
+        if cmd == 'play':
+            agent1, agent2 = request['agents']
+            return await self.play(agent1, agent2, request.get('opening_moves', 4), request.get('seed'))
+        if cmd == 'move':
+            cells = decode_game(request.get('game', ''))
+            board = board_obj()
+            for _cell in cells:
+                if ops.check_game_finished(board) or not ops.check_move_is_valid(board, (_cell//9, _cell%9)):
+                    raise ValueError(f'invalid move {chr(_cell + 32)!r} after {board.n_moves} moves')
+                ops.make_move(board, (_cell//9, _cell%9))
+            if board.n_moves and ops.check_game_finished(board):
+                raise ValueError('the game is over')
+            cell, elapsed, error = await self.pool.move(request['agent'], cells, self.deadline)
+            if cell is not None and not ops.check_move_is_valid(board, (cell//9, cell%9)):
+                cell, error = None, f'invalid move {cell}'
+            return {'move': None if cell is None else chr(cell + 32), 'seconds': elapsed, 'error': error}
+        if cmd == 'stats':
+            return self.snapshot()
+        raise ValueError(f'unknown cmd {cmd}, use play, move or stats')
+
+    def snapshot(self) -> dict:
+        return {**self.stats.snapshot(), 'workers': self.pool.workers, 'workers_replaced': self.pool.replaced}
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8765, path: str = None) -> None:
+        ''' warms the pool up and starts listening (on the unix socket path if given) '''
+        await self.pool.start()
+        if path is not None:
+            self._servers.append(await asyncio.start_unix_server(self._handle, path=path))
+        else:
+            self._servers.append(await asyncio.start_server(self._handle, host, port))
+
+    async def serve(self, host: str = '127.0.0.1', port: int = 8765, path: str = None, report_every: float = None) -> None:
+        ''' runs until cancelled, printing the throughput every report_every seconds '''
+        await self.start(host, port, path)
+        try:
+            if not report_every:
+                await asyncio.Event().wait()
+            while True:
+                await asyncio.sleep(report_every)
+                print(format_stats(self.snapshot()), flush=True)
+        finally:
+            self.close()
+
+    def close(self) -> None:
+        for server in self._servers:
+            server.close()
+        self._servers = []
+        self.pool.close()
+
+def format_stats(stats: dict) -> str:
+    return (f"{stats['games_per_sec']:.1f} games/s  {stats['moves_per_sec']:.1f} moves/s  "
+            f"{stats['active_games']} active  {stats['games']} games  {stats['forfeits']} forfeits "
+            f"({stats['timeouts']} timeouts)  {stats['workers_replaced']} workers replaced")
+
+''' ------------------ client ---------------- '''
+
+class match_client:
+    ''' asyncio client, every request can be awaited concurrently over the one connection '''
+    def __init__(self, host: str = '127.0.0.1', port: int = 8765, path: str = None) -> None:
+        self.host, self.port, self.path = host, port, path
+        self._reader = None
+        self._writer = None
+        self._pending = {}
+        self._next_id = 0
+        self._listener = None
+
+    async def __aenter__(self):
+        if self.path is not None:
+            self._reader, self._writer = await asyncio.open_unix_connection(self.path, limit=2**20)
+        else:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port, limit=2**20)
+        self._listener = asyncio.ensure_future(self._listen())
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._writer.close()
+        await self._writer.wait_closed()
+        self._listener.cancel()
+
+    async def _listen(self) -> None:
+        while True:
+            line = await self._reader.readline()
+            if not line:
+                break
+            msg = json.loads(line)
+            future = self._pending.pop(msg.pop('id'), None)
+            if future is not None and not future.done():
+                future.set_result(msg)
+        for future in self._pending.values():
+            future.set_exception(ConnectionError('the server closed the connection'))
+
+    async def request(self, cmd: str, **kwargs) -> dict:
+        self._next_id += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending[self._next_id] = future
+        self._writer.write(json.dumps({'id': self._next_id, 'cmd': cmd, **kwargs}).encode() + b'\n')
+        await self._writer.drain()
+        msg = await future
+        if 'error' in msg and len(msg) == 1:
+            raise RuntimeError(msg['error'])
+        return msg
+
+    async def play(self, agent1: str, agent2: str, opening_moves: int = 4, seed: int = None) -> dict:
+        return await self.request('play', agents=[agent1, agent2], opening_moves=opening_moves, seed=seed)
+
+    async def move(self, agent: str, game: str) -> dict:
+        return await self.request('move', agent=agent, game=game)
+
+    async def stats(self) -> dict:
+        return await self.request('stats')
+
+def main(argv: list = None) -> None:
+    parser = argparse.ArgumentParser(description='serve games between pooled bots')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this unix socket instead of TCP')
+    parser.add_argument('--workers', type=int, default=None, help='bot worker processes (default: all cores)')
+    parser.add_argument('--deadline', type=float, default=0.5, help='hard limit per move in seconds')
+    parser.add_argument('--agent', action='append', default=[], help='extra agent, name=module:attribute')
+    parser.add_argument('--report-every', type=float, default=10.0, help='print the throughput every this many seconds')
+    args = parser.parse_args(argv)
+
+    agents = dict(default_agents)
+    agents.update(load_agent(_spec) for _spec in args.agent)
+    server = match_server(agents, args.workers, args.deadline)
+    try:
+        asyncio.run(server.serve(args.host, args.port, args.unix, args.report_every))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,30 @@
+from arena import play_game, run_match
+from line_completer import fast_line_completer_bot
+
+class _raising_bot:
+    def move(self, board_dict) -> tuple:
+        raise RuntimeError('broken')
+
+class _stateful_bot:
+    ''' plays the n-th legal move, n counts every move this instance made, so it remembers earlier games '''
+    def __init__(self) -> None:
+        self.count = 0
+
+    def move(self, board_dict) -> tuple:
+        self.count += 1
+        moves = board_dict['valid_moves']
+        return moves[self.count % len(moves)]
+
+def test_exception_forfeits():
+    game = play_game(fast_line_completer_bot(), _raising_bot(), opening_moves=0)
+    assert game['forfeit'] == 1 and game['result'] == 0
+    assert game['error'] == 'RuntimeError: broken'
+
+    report = run_match(_raising_bot, fast_line_completer_bot, n_games=4, n_jobs=1)
+    assert report['forfeits'] == (4, 0) and report['loss'] == 4
+
+def test_results_dont_depend_on_n_jobs():
+    keys = ('win', 'loss', 'draw', 'first_player_wins', 'moves_per_game')
+    reports = [run_match(_stateful_bot, fast_line_completer_bot, n_games=40, n_jobs=_n) for _n in (1, 2, 3)]
+    for report in reports[1:]:
+        assert [report[_k] for _k in keys] == [reports[0][_k] for _k in keys]
@@ -0,0 +1,41 @@
+'''
+the bitboard ops against the frozen numpy implementation, on seeded random games with random take backs
+'''
+import random
+
+import numpy as np
+
+from benchmarks.numpy_reference import numpy_ops
+from board import board_obj
+from operations import ops
+
+def _moves(moves: list) -> list:
+    return [(int(_r), int(_c)) for _r, _c in moves]
+
+def _check_same(board: board_obj, reference: board_obj) -> None:
+    assert board.n_moves == reference.n_moves
+    assert np.array_equal(board.markers, reference.markers)
+    assert np.array_equal(board.miniboxes, reference.miniboxes)
+    assert np.array_equal(board.hist, reference.hist)
+    finished = board.n_moves > 0 and ops.check_game_finished(board)
+    if board.n_moves:
+        assert finished == bool(numpy_ops.check_game_finished(reference))
+    assert ops.get_winner(board) == numpy_ops.get_winner(reference)
+    if not finished:
+        assert ops.get_valid_moves(board) == _moves(numpy_ops.get_valid_moves(reference))
+
+def test_against_numpy_reference():
+    rng = random.Random(2024)
+    for _ in range(150):
+        board, reference = board_obj(), board_obj()
+        _check_same(board, reference)
+        while not (board.n_moves and ops.check_game_finished(board)):
+            move = rng.choice(ops.get_valid_moves(board))
+            ops.make_move(board, move)
+            numpy_ops.make_move(reference, move)
+            _check_same(board, reference)
+            if rng.random() < 0.1:
+                for _ in range(rng.randint(1, min(3, board.n_moves))):
+                    ops.undo_move(board)
+                    numpy_ops.undo_move(reference)
+                    _check_same(board, reference)
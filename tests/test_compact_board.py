@@ -0,0 +1,41 @@
+import copy
+import pickle
+import random
+
+import numpy as np
+
+from board import compact_board
+from operations import ops
+
+def _random_board(seed: int, n_moves: int) -> compact_board:
+    rng = random.Random(seed)
+    board = compact_board()
+    for _ in range(n_moves):
+        ops.make_move(board, rng.choice(ops.get_valid_moves(board)))
+    return board
+
+def _same_position(a, b) -> None:
+    assert a.snapshot() == b.snapshot()
+    assert a.key == b.key
+    assert a.legal_bits == b.legal_bits and a.active == b.active
+    assert np.array_equal(a.markers, b.markers)
+    assert np.array_equal(a.miniboxes, b.miniboxes)
+
+def test_copies_stay_in_step_with_their_buffer():
+    for _copy in (copy.copy, copy.deepcopy, lambda b: pickle.loads(pickle.dumps(b))):
+        board = _random_board(1, 12)
+        before = board.snapshot()
+        other = _copy(board)
+        _same_position(other, board)
+
+        move = ops.get_valid_moves(other)[0]
+        ops.make_move(other, move)
+        expected = board.clone()
+        ops.make_move(expected, move)
+        _same_position(other, expected)
+        _same_position(other.clone(), expected)
+        _same_position(compact_board.from_snapshot(other.snapshot()), expected)
+        assert board.snapshot() == before # the original is untouched
+
+        ops.undo_move(other)
+        _same_position(other, board)
@@ -0,0 +1,35 @@
+import numpy as np
+
+from arena import play_game
+from board import board_obj
+from operations import ops
+
+class _fixed_bot:
+    def __init__(self, move) -> None:
+        self.reply = move
+
+    def move(self, board_dict) -> tuple:
+        return self.reply
+
+def test_check_move_is_valid_coordinates():
+    board = board_obj()
+    for move in ((0, 3), (np.int64(0), np.uint8(3)), [0, 3]):
+        assert ops.check_move_is_valid(board, move)
+    for move in ((0, 3.7), (0.0, 3.0), ('1', '2'), (True, False), (np.bool_(True), 0), (0, 9), (-1, 0), None, (1, 2, 3)):
+        assert not ops.check_move_is_valid(board, move)
+
+def test_bad_coordinates_forfeit():
+    for move in ((0, 3.7), ('1', '2'), (True, False)):
+        game = play_game(_fixed_bot(move), _fixed_bot(move), opening_moves=0)
+        assert game['forfeit'] == 0 and game['result'] == 1
+
+def test_board_view_is_read_only():
+    board = board_obj()
+    view = ops.pull_view(board)
+    state, moves = view['board_state'], view['valid_moves']
+    assert not state.flags.writeable and isinstance(moves, tuple)
+    ops.make_move(board, moves[0])
+    ops.undo_move(board)
+    # back on the same key the cached values are served again, unchanged
+    assert np.array_equal(view['board_state'], ops.pull_dictionary(board)['board_state'])
+    assert list(view['valid_moves']) == ops.get_valid_moves(board)
@@ -0,0 +1,13 @@
+from functools import partial
+
+from arena import run_match
+from line_completer import fast_line_completer_bot
+from parallel import root_parallel_bot
+
+def test_root_parallel_in_arena_workers():
+    # arena's pool workers are daemonic and can't start the bot's workers, it searches in process
+    for engine in ('mcts', 'alphabeta'):
+        bot = partial(root_parallel_bot, workers=2, thinking_time=0.01, engine=engine)
+        report = run_match(bot, fast_line_completer_bot, n_games=2, n_jobs=2)
+        assert report['win'] + report['loss'] + report['draw'] == 2
+        assert report['forfeits'] == (0, 0)
@@ -0,0 +1,11 @@
+import pytest
+
+from search import search_bot
+
+def test_check_every():
+    assert search_bot().check_mask == 255
+    assert search_bot(check_every=300).check_mask == 255 # rounded down to a power of two
+    assert search_bot(check_every=1).check_mask == 0
+    for check_every in (0, -3):
+        with pytest.raises(ValueError):
+            search_bot(check_every=check_every)
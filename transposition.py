@@ -0,0 +1,73 @@
+'''
+fixed-size transposition table for the search bots, keyed by board_obj.key
+
+entries live in preallocated parallel lists, the slot is the low bits of the key
+replacement is depth-preferred: a slot is only overwritten by the same position,
+a search at least as deep, or anything once the stored entry is from an older search
+'''
+
+# bound types
+EXACT = 0 # the stored value is the true value
+LOWER = 1 # the search failed high, the true value is >= the stored value
+UPPER = 2 # the search failed low, the true value is <= the stored value
+
+class transposition_table:
+    def __init__(self, size_log2: int = 20) -> None:
+        self.size = 1 << size_log2
+        self.mask = self.size - 1
+        self.keys = [-1] * self.size # -1 never matches a key, keys are unsigned
+        self.depths = [0] * self.size
+        self.values = [0] * self.size
+        self.flags = [EXACT] * self.size
+        self.moves = [None] * self.size
+        self.ages = [0] * self.size
+        self.age = 0
+
+    def new_search(self) -> None:
+        ''' call once per root search, entries from earlier searches become replaceable '''
+        self.age += 1
+
+    def clear(self) -> None:
+        ''' empties every slot, as a new table '''
+        self.keys = [-1] * self.size
+        self.depths = [0] * self.size
+        self.values = [0] * self.size
+        self.flags = [EXACT] * self.size
+        self.moves = [None] * self.size
+        self.ages = [0] * self.size
+        self.age = 0
+
+    def store(self, key: int, depth: int, value, flag: int, move) -> None:
+        _slot = key & self.mask
+        if self.keys[_slot] == key or depth >= self.depths[_slot] or self.ages[_slot] != self.age:
+            self.keys[_slot] = key
+            self.depths[_slot] = depth
+            self.values[_slot] = value
+            self.flags[_slot] = flag
+            self.moves[_slot] = move
+            self.ages[_slot] = self.age
+
+    def probe(self, key: int) -> int:
+        ''' returns the slot holding key, or -1 if it isn't stored '''
+        _slot = key & self.mask
+        if self.keys[_slot] == key:
+            return _slot
+        return -1
+
+    def get(self, key: int):
+        ''' returns (depth, value, flag, move) for key, or None '''
+        _slot = key & self.mask
+        if self.keys[_slot] != key:
+            return None
+        return self.depths[_slot], self.values[_slot], self.flags[_slot], self.moves[_slot]
+
+    def best_move(self, key: int):
+        ''' the stored move for key (for move ordering), or None '''
+        _slot = key & self.mask
+        if self.keys[_slot] != key:
+            return None
+        return self.moves[_slot]
+
+    def usage(self) -> float:
+        ''' fraction of slots written during the current search '''
+        return sum(1 for _age in self.ages if _age == self.age and self.age) / self.size
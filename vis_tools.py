@@ -1,16 +1,21 @@
 '''
-two things here
+three things here
 1) the fancy plotting (original matplotlib plotting)
 2) conversion tools for nathan's visualization
+3) board_renderer: the same picture with the static layers drawn once, for replaying games frame
+   by frame and for batch export (a game to GIF, many positions to one PNG grid)
 
 '''
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.colors import LinearSegmentedColormap
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
 checkerboard_cmap = LinearSegmentedColormap.from_list('mycmap', ['lightgrey', 'white'])
 
 from operations import ops
 from board import board_obj
+from bitboard import line_table, to_mask
 
 def checkerboard(shape):
     # from https://stackoverflow.com/questions/2169478/how-to-make-a-checkerboard-in-numpy
@@ -22,15 +27,7 @@ def _check_line(box):
     box is a (3,3) array
     returns True if a line is found
     '''
-    for i in range(3):
-        if abs(sum(box[:,i])) == 3: return True # horizontal
-        if abs(sum(box[i,:])) == 3: return True # vertical
-
-    # diagonals
-    if abs(box.trace()) == 3: return True
-    if abs(np.rot90(box).trace()) == 3: return True
-    # no line found
-    return False
+    return line_table[to_mask(box == 1)] or line_table[to_mask(box == -1)]
 
 def calc_finished_boxes(temp_dict):
     ''' only used in plotting '''
@@ -51,13 +48,6 @@ def calc_finished_boxes(temp_dict):
 
 def fancy_draw_board(board_obj, marker_size: int = 100) -> None:
 
-    # pull board information (marker and miniboxes)
-    temp_dict = ops.pull_dictionary(board_obj)
-    
-    # flip board state for visualization of p2's turn.
-    if board_obj.n_moves%2 == 1:
-        temp_dict['board_state'] *= -1
-        
     plt.imshow(checkerboard((9,9)), cmap=checkerboard_cmap, origin='lower')
     for i in [-0.5,2.5,5.5, 8.5]:
         plt.axvline(i,c='k')
@@ -65,14 +55,14 @@ def fancy_draw_board(board_obj, marker_size: int = 100) -> None:
     plt.xticks(np.arange(9))
     plt.yticks(np.arange(9))
 
-    # markers
-    plt.scatter(*np.where(temp_dict['board_state'] == -1),
+    # markers (first player o, second player x), straight from the board
+    plt.scatter(*np.where(board_obj.markers[:,:,1]),
                 marker='x',s=marker_size,c='tab:blue')
-    plt.scatter(*np.where(temp_dict['board_state'] == 1),
+    plt.scatter(*np.where(board_obj.markers[:,:,0]),
                 marker='o',s=marker_size,c='tab:orange')
 
-    # miniboard markers
-    finished_boxes = calc_finished_boxes(temp_dict)
+    # miniboard markers, board_obj.miniboxes holds the finished boxes (p1, p2, stale)
+    finished_boxes = board_obj.miniboxes
     x_boxes = np.where(finished_boxes[:,:,1] == 1)
     o_boxes = np.where(finished_boxes[:,:,0] == 1)
     plt.scatter(x_boxes[0]*3+1,x_boxes[1]*3+1,
@@ -116,3 +106,152 @@ def load_game(game_string: str) -> board_obj:
         ops.make_move(temp_board, _move)
         debug_log.append(encoded_position)
     return temp_board
+
+''' ---- part 3: cached and batch rendering ----- '''
+
+class board_renderer:
+    '''
+    fancy_draw_board with the checkerboard, grid and ticks drawn once and cached as a bitmap
+    every frame restores the cached background and redraws only the markers, finished boxes,
+    valid moves and label (blitting); an artist is only rebuilt when its part of the board changed
+
+        renderer = board_renderer()
+        image = renderer.render(board)          # (H, W, 4) uint8 RGBA
+        renderer.save(board, 'position.png')
+
+    ax=None draws on a figure of its own that pyplot never shows (batch export), pass a pyplot
+    axes to draw into a notebook figure instead (then call update(board) and show the figure)
+    '''
+    def __init__(self, ax=None, marker_size: int = 100, show_valid: bool = False,
+                 figsize: tuple = (4, 4), dpi: int = 100) -> None:
+        if ax is None:
+            self.fig = Figure(figsize=figsize, dpi=dpi)
+            FigureCanvasAgg(self.fig)
+            ax = self.fig.add_subplot()
+        self.fig = ax.figure
+        self.ax = ax
+        self.show_valid = show_valid
+
+        # static layers, the same as fancy_draw_board
+        ax.imshow(checkerboard((9,9)), cmap=checkerboard_cmap, origin='lower')
+        for i in [-0.5,2.5,5.5, 8.5]:
+            ax.axvline(i,c='k')
+            ax.axhline(i,c='k')
+        ax.set_xticks(np.arange(9))
+        ax.set_yticks(np.arange(9))
+        ax.set_xlim(-0.5, 8.5)
+        ax.set_ylim(-0.5, 8.5)
+
+        # dynamic layers, drawn in this order
+        _empty = np.empty((0, 2))
+        self.artists = {'x': ax.scatter(*_empty.T, marker='x', s=marker_size, c='tab:blue'),
+                        'o': ax.scatter(*_empty.T, marker='o', s=marker_size, c='tab:orange'),
+                        'x_boxes': ax.scatter(*_empty.T, marker='s', s=marker_size*50, alpha=0.6, c='tab:blue'),
+                        'o_boxes': ax.scatter(*_empty.T, marker='s', s=marker_size*50, alpha=0.6, c='tab:orange'),
+                        'stale_boxes': ax.scatter(*_empty.T, marker='s', s=marker_size*50, alpha=0.3, c='k'),
+                        'valid': ax.scatter(*_empty.T, marker='s', c='purple'),
+                        'label': ax.set_title('')}
+        for artist in self.artists.values():
+            artist.set_animated(True) # left out of canvas.draw(), so the background stays clean
+        self._state = {}          # artist name -> what it shows now
+        self._background = None
+        self._background_size = None
+
+    def update(self, board: board_obj, label: str = '') -> None:
+        ''' points the dynamic artists at board, skipping the ones whose data didn't change '''
+        markers = board.markers
+        miniboxes = board.miniboxes
+        sources = {'x': markers[:,:,1], 'o': markers[:,:,0],
+                   'x_boxes': miniboxes[:,:,1], 'o_boxes': miniboxes[:,:,0], 'stale_boxes': miniboxes[:,:,2]}
+        for name, source in sources.items():
+            _key = source.tobytes()
+            if self._state.get(name) != _key:
+                self._state[name] = _key
+                _offsets = np.argwhere(source)
+                if name.endswith('boxes'):
+                    _offsets = _offsets*3 + 1
+                self.artists[name].set_offsets(_offsets.reshape(-1, 2))
+        if self.show_valid:
+            _key = (board.n_moves, board.key)
+            if self._state.get('valid') != _key:
+                self._state['valid'] = _key
+                self.artists['valid'].set_offsets(np.array(ops.get_valid_moves(board)).reshape(-1, 2))
+        if self._state.get('label') != label:
+            self._state['label'] = label
+            self.artists['label'].set_text(label)
+
+    def render(self, board: board_obj, label: str = '') -> np.array:
+        ''' (H, W, 4) uint8 RGBA image of board '''
+        self.update(board, label)
+        canvas = self.fig.canvas
+        size = canvas.get_width_height()
+        if self._background is None or size != self._background_size:
+            canvas.draw()
+            self._background = canvas.copy_from_bbox(self.fig.bbox)
+            self._background_size = size
+        else:
+            canvas.restore_region(self._background)
+        for name, artist in self.artists.items():
+            if name != 'valid' or self.show_valid:
+                self.fig.draw_artist(artist)
+        return np.array(canvas.buffer_rgba())
+
+    def save(self, board: board_obj, path: str, label: str = '') -> None:
+        _save_png(self.render(board, label), path)
+
+def _save_png(image: np.array, path: str) -> None:
+    from PIL import Image # pillow comes with matplotlib
+    Image.fromarray(image).save(path)
+
+def _as_board(game) -> board_obj:
+    ''' a board_obj as is, a game string (cvt_vis_app) is replayed '''
+    return load_game(game) if isinstance(game, str) else game
+
+def game_frames(game):
+    ''' the position after every move of game (board_obj or game string), one scratch board that moves along '''
+    game = _as_board(game)
+    board = board_obj()
+    yield board
+    for _move in game.hist[:game.n_moves]:
+        ops.make_move(board, (int(_move[0]), int(_move[1])))
+        yield board
+
+def image_grid(images: list, columns: int = None) -> np.array:
+    ''' tiles equally sized images row by row, columns defaults to a square-ish grid '''
+    columns = columns or int(np.ceil(np.sqrt(len(images))))
+    rows = -(-len(images) // columns)
+    height, width, depth = images[0].shape
+    out = np.full((rows*height, columns*width, depth), 255, dtype=np.uint8)
+    for idx, image in enumerate(images):
+        _r, _c = divmod(idx, columns)
+        out[_r*height:(_r+1)*height, _c*width:(_c+1)*width] = image
+    return out
+
+def export_game(game, path: str, frame_seconds: float = 0.5, columns: int = None,
+                renderer: board_renderer = None) -> int:
+    '''
+    every position of a game (board_obj or game string) in one pass: an animated GIF if path
+    ends in .gif, otherwise one PNG grid of all frames; returns the number of frames
+    '''
+    renderer = renderer or board_renderer()
+    images = [renderer.render(_board, f'move {_board.n_moves}') for _board in game_frames(game)]
+    if path.lower().endswith('.gif'):
+        from PIL import Image # pillow comes with matplotlib
+        frames = [Image.fromarray(_image).convert('RGB') for _image in images]
+        # hold the final position a little longer
+        durations = [int(frame_seconds * 1000)] * (len(frames) - 1) + [int(frame_seconds * 4000)]
+        frames[0].save(path, save_all=True, append_images=frames[1:], duration=durations, loop=0)
+    else:
+        _save_png(image_grid(images, columns), path)
+    return len(images)
+
+def export_grid(games: list, path: str, labels: list = None, columns: int = None,
+                renderer: board_renderer = None) -> None:
+    '''
+    many positions (board_objs or game strings, e.g. from a tournament log via gamelog) in one
+    PNG grid, drawn with one renderer; labels default to the position's index
+    '''
+    renderer = renderer or board_renderer()
+    labels = labels or [str(_idx) for _idx in range(len(games))]
+    images = [renderer.render(_as_board(_game), _label) for _game, _label in zip(games, labels)]
+    _save_png(image_grid(images, columns), path)
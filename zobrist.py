@@ -0,0 +1,22 @@
+'''
+zobrist keys for board_obj.key
+
+the key of a position is the XOR of
+    one key per (player, cell) marker
+    one key per (channel, box) finished box
+    side_key when the second player is to move
+    one key for the active box (index 0 is "play anywhere")
+ops.make_move/undo_move keep board_obj.key up to date, it is a 64-bit int
+'''
+import random
+
+# fixed seed so keys (and anything stored under them) are the same between runs
+_rng = random.Random(0x5eed)
+
+cell_keys = [[_rng.getrandbits(64) for _ in range(81)] for _ in range(2)]
+finished_keys = [[_rng.getrandbits(64) for _ in range(9)] for _ in range(3)]
+side_key = _rng.getrandbits(64)
+active_keys = [_rng.getrandbits(64) for _ in range(10)] # indexed by active box + 1
+
+# key of the empty board (first player to move, play anywhere)
+start_key = active_keys[0]